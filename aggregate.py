@@ -0,0 +1,140 @@
+"""
+Headless totals over activity files, streamed row by row.
+
+    python aggregate.py activities_*.csv --by year sport
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import glob
+import os
+import sys
+from date_util import ordinal_from_str
+from datetime import date
+from journal import Journal
+from model import format_number, parse_distance, parse_intensity
+from storage import CsvStorage
+from timedelta_util import minutes_from_hh_mm, minutes_to_hh_mm
+
+PERIODS = ('sport', 'week', 'month', 'year')
+
+
+def read_rows(csv_filename, delimiter='|'):
+    """
+    yields (date, [str fields]) rows of a year file with its journal
+    applied, the csv is never loaded whole
+    """
+    journal = dict(Journal(csv_filename, delimiter=delimiter).entries())
+    if os.path.isfile(csv_filename):
+        with open(csv_filename, 'r') as csv_file:
+            for row in csv.reader(csv_file, delimiter=delimiter):
+                if row:
+                    day = date.fromordinal(ordinal_from_str(row[0]))
+                    if day not in journal:
+                        yield day, row[1:]
+    for day in sorted(journal):
+        for activity in journal[day]:
+            yield day, activity
+
+
+def read_activities(csv_filename, delimiter='|'):
+    """
+    yields (date, sport, minutes, distance, intensity) tuples
+    """
+    for day, fields in read_rows(csv_filename, delimiter):
+        fields = list(fields) + [''] * (4 - len(fields))
+        yield (day, fields[0], minutes_from_hh_mm(fields[1]),
+               parse_distance(fields[2]), parse_intensity(fields[3]))
+
+
+def group_key(activity, by):
+    day, sport = activity[0], activity[1]
+    key = []
+    for period in by:
+        if period == 'sport':
+            key.append(sport)
+        elif period == 'week':
+            iso_year, week, _ = day.isocalendar()
+            key.append('{}-W{:02d}'.format(iso_year, week))
+        elif period == 'month':
+            key.append('{}-{:02d}'.format(day.year, day.month))
+        else:
+            key.append(str(day.year))
+    return tuple(key)
+
+
+def aggregate(activities, by):
+    """
+    returns {key: [count, minutes, distance, intensity weighted minutes]}
+    """
+    totals = {}
+    for activity in activities:
+        total = totals.setdefault(group_key(activity, by), [0, 0, 0.0, 0])
+        total[0] += 1
+        total[1] += activity[2]
+        total[2] += activity[3]
+        total[3] += activity[2] * activity[4]
+    return totals
+
+
+def aggregate_file(csv_filename, by, delimiter='|'):
+    return aggregate(read_activities(csv_filename, delimiter), by)
+
+
+def merge(totals_list):
+    merged = {}
+    for totals in totals_list:
+        for key, values in totals.items():
+            total = merged.setdefault(key, [0, 0, 0.0, 0])
+            for i, value in enumerate(values):
+                total[i] += value
+    return merged
+
+
+def aggregate_files(csv_filenames, by, workers=None, delimiter='|'):
+    """
+    aggregates every file in its own process and merges the totals
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(aggregate_file, csv_filename, by, delimiter)
+                   for csv_filename in csv_filenames]
+        return merge(future.result() for future in futures)
+
+
+def expand(paths, csv_prefix):
+    """
+    yields year csv filenames of files, globs or directories, a year
+    kept only in its journal is given by the csv filename it will have
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            storage = CsvStorage(os.path.join(path, csv_prefix))
+            yield from (storage.filename(year) for year in storage.years())
+            continue
+        root, ext = os.path.splitext(path)
+        names = glob.glob(path)
+        if ext == '.csv':
+            names += glob.glob(root + '.journal')
+        names = {os.path.splitext(name)[0] + '.csv' for name in names}
+        yield from sorted(names) or [path]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sum activity files')
+    parser.add_argument('paths', nargs='+', help='activity files, globs or directories')
+    parser.add_argument('--by', nargs='+', choices=PERIODS, default=['year'])
+    parser.add_argument('--prefix', default='activities')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    totals = aggregate_files(list(expand(args.paths, args.prefix)), args.by, args.workers)
+    writer = csv.writer(sys.stdout, delimiter='|', lineterminator='\n')
+    writer.writerow(tuple(args.by) + ('count', 'duration', 'distance', 'load'))
+    for key in sorted(totals):
+        count, minutes, distance, load = totals[key]
+        writer.writerow(key + (count, minutes_to_hh_mm(minutes),
+                               format_number(round(distance, 2)), load))
+
+
+if __name__ == "__main__":
+    main()
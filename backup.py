@@ -0,0 +1,162 @@
+"""
+Incremental, deduplicated backups of activity files.
+
+    python backup.py list
+    python backup.py restore 2018-05-18T10-20-30 --to restored/
+"""
+from datetime import datetime
+import argparse
+import hashlib
+import json
+import os
+import threading
+import zlib
+from file_util import atomic_write
+
+# a chunk ends after a line whose crc32 has these bits zero,
+# ~64 lines per chunk, so an edit only changes chunks around it
+CHUNK_MASK = 0x3f
+CHUNK_MAX = 1024 * 1024
+
+
+def split_chunks(data):
+    chunks = []
+    start = 0
+    pos = 0
+    while pos < len(data):
+        end = data.find(b'\n', pos)
+        end = len(data) if end < 0 else end + 1
+        if (zlib.crc32(data[pos:end]) & CHUNK_MASK == 0 or
+                end - start >= CHUNK_MAX or end == len(data)):
+            chunks.append(data[start:end])
+            start = end
+        pos = end
+    return chunks
+
+
+class Backup:
+    """
+    Content addressed backup store:
+        <path>/objects/ab/abcd...     zlib compressed chunk named by sha256
+        <path>/snapshots/<name>.json  chunk lists of files in a snapshot
+    Files with unchanged size and mtime are not read again and chunks
+    already stored are not written again.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._objects = os.path.join(path, 'objects')
+        self._snapshots = os.path.join(path, 'snapshots')
+        self._lock = threading.Lock()
+        self._last = None
+
+    def snapshots(self):
+        if not os.path.isdir(self._snapshots):
+            return []
+        return sorted(name[:-len('.json')] for name in os.listdir(self._snapshots)
+                      if name.endswith('.json'))
+
+    def manifest(self, name):
+        with open(os.path.join(self._snapshots, name + '.json')) as f:
+            return json.load(f)
+
+    def snapshot(self, filenames, name=None):
+        """
+        backs up filenames, returns snapshot name or None when
+        nothing changed since the last snapshot
+        """
+        with self._lock:
+            last = self._last_files()
+            files = {}
+            for filename in filenames:
+                if not os.path.isfile(filename):
+                    continue
+                stat = os.stat(filename)
+                entry = last.get(filename)
+                if not (entry and entry['size'] == stat.st_size and
+                        entry['mtime_ns'] == stat.st_mtime_ns):
+                    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                             'chunks': self._store_file(filename)}
+                files[filename] = entry
+            if files == last:
+                return None
+            name = name or datetime.now().strftime('%Y-%m-%dT%H-%M-%S-%f')
+            os.makedirs(self._snapshots, exist_ok=True)
+            manifest = {'created': datetime.now().isoformat(), 'files': files}
+            with atomic_write(os.path.join(self._snapshots, name + '.json')) as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            self._last = files
+            return name
+
+    def restore(self, name, target_dir='.', filenames=None):
+        """
+        writes files of snapshot name into target_dir, returns written paths
+        """
+        written = []
+        for filename, entry in sorted(self.manifest(name)['files'].items()):
+            if filenames and filename not in filenames:
+                continue
+            target = os.path.join(target_dir, filename)
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            with atomic_write(target, 'wb') as f:
+                for digest in entry['chunks']:
+                    f.write(self._read_chunk(digest))
+            written.append(target)
+        return written
+
+    # private
+    def _last_files(self):
+        if self._last is None:
+            names = self.snapshots()
+            self._last = self.manifest(names[-1])['files'] if names else {}
+        return self._last
+
+    def _store_file(self, filename):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        return [self._store_chunk(chunk) for chunk in split_chunks(data)]
+
+    def _chunk_path(self, digest):
+        return os.path.join(self._objects, digest[:2], digest)
+
+    def _store_chunk(self, chunk):
+        digest = hashlib.sha256(chunk).hexdigest()
+        path = self._chunk_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_write(path, 'wb') as f:
+                f.write(zlib.compress(chunk, 9))
+        return digest
+
+    def _read_chunk(self, digest):
+        with open(self._chunk_path(digest), 'rb') as f:
+            chunk = zlib.decompress(f.read())
+        if hashlib.sha256(chunk).hexdigest() != digest:
+            raise ValueError('corrupted backup chunk {}'.format(digest))
+        return chunk
+
+
+def main(argv=None):
+    from config import Config
+    parser = argparse.ArgumentParser(description='Activity backups')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('list', help='list snapshots')
+    restore_cmd = commands.add_parser('restore', help='restore a snapshot')
+    restore_cmd.add_argument('snapshot')
+    restore_cmd.add_argument('files', nargs='*')
+    restore_cmd.add_argument('--to', default='.')
+    args = parser.parse_args(argv)
+
+    backup = Backup(Config().backup_path)
+    if args.command == 'list':
+        for name in backup.snapshots():
+            print(name)
+    elif args.command == 'restore':
+        for filename in backup.restore(args.snapshot, args.to, args.files):
+            print(filename)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Headless benchmarks of the ui and loading paths, run against faketk
+widgets and generated activity files.
+
+    python benchmark.py generate bench-data --years 2010 2019 --per-day 3
+    python benchmark.py run bench-data --save-baseline benchmark_baseline.json
+    python benchmark.py run bench-data --baseline benchmark_baseline.json
+
+run exits with 1 when a stage got slower (or used more memory) than the
+baseline by more than --threshold.
+"""
+from datetime import date
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+import faketk
+
+SPORTS = ('run', 'bike', 'zwift', 'gym short', 'gym long', 'crossfit')
+
+
+def generate(directory, first_year, last_year, per_day=2, density=0.7,
+             prefix='activities', seed=1):
+    """
+    writes <prefix>_<year>.csv files, density is the share of days with
+    activities, each such day has 1 to per_day of them
+    """
+    rnd = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for year in range(first_year, last_year + 1):
+        filename = os.path.join(directory, '{}_{}.csv'.format(prefix, year))
+        first, last = date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+        with open(filename, 'w') as f:
+            for ordinal in range(first, last + 1):
+                if rnd.random() >= density:
+                    continue
+                for _ in range(rnd.randint(1, per_day)):
+                    minutes = rnd.randint(10, 180)
+                    f.write('{}|{}|{:02d}:{:02d}|{}|{}|generated\n'.format(
+                        date.fromordinal(ordinal), rnd.choice(SPORTS),
+                        minutes // 60, minutes % 60,
+                        round(rnd.uniform(0, 60), 1), rnd.randint(1, 5)))
+        filenames.append(filename)
+    return filenames
+
+
+def data_years(directory, prefix='activities'):
+    years = []
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        if ext == '.csv' and stem.startswith(prefix + '_') and stem[-4:].isdigit():
+            years.append(int(stem[-4:]))
+    return sorted(years)
+
+
+class Stages:
+    """
+    builds the app once on fake widgets inside the data directory,
+    each stage method is one timed run
+    """
+
+    def __init__(self, years):
+        from sportsapp import Sportsapp
+        from table import Table
+        self._years = years
+        self.app = Sportsapp(date(years[0], 1, 1))
+        faketk.run_pending()
+        self._grid = self.app._ui._cal_grid
+        self._table = Table(None, [{'label': name} for name in
+                                   ('Sport', 'Duration', 'Distance', 'Intensity',
+                                    'Description')])
+        self._rows = [('run', '01:00', '10', '3', 'generated')] * 10
+        self._image_grid = None
+        self._virtual_table = None
+
+    def create_grid_year(self):
+        # ends on the shown year so later stages color a matching grid
+        shown = self.app._year.year
+        for year in [y for y in self._years if y != shown] + [shown]:
+            self._grid.create_grid_year(year)
+
+    def load_activities_from_file(self):
+        # cold cache, time until the year is shown, the prefetches it
+        # started are waited for so they do not run during later stages
+        app = self.app
+        app._years.join()
+        app._years.clear()
+        for year in self._years:
+            app._selected_date = date(year, 1, 1)
+            app.change_year(app._selected_date)
+            faketk.run_pending(until=lambda: app._year is not None)
+        faketk.run_pending()
+        app._years.join()
+
+    def color_grid(self):
+        self.app.color_grid()
+        faketk.run_pending()
+
+    def image_set_tiles_color(self):
+        # same repaint as color_grid on the single image backend
+        from imagegrid import ImageGrid
+        if self._image_grid is None:
+            self._image_grid = ImageGrid(None)
+        self._image_grid.create_grid_year(self.app._year.year)
+        self._image_grid.set_tiles_color(self.app._year.colors.items())
+
+    def table_add_row(self):
+        for values in self._rows:
+            self._table.add_row(*values)
+        self._table.clear_table()
+
+    def table_clear(self):
+        self._table.load(self._rows)
+        self._table.clear_table()
+
+    def virtual_table_scroll(self):
+        # rows of a decade through a pool of 10 rows, page by page
+        from table import VirtualTable
+        if self._virtual_table is None:
+            self._virtual_table = VirtualTable(None, [{'label': name} for name in
+                                                      ('Sport', 'Duration', 'Distance',
+                                                       'Intensity', 'Description')])
+        table = self._virtual_table
+        table.replace_rows(self._rows * 365)
+        for _ in range(0, table.size(), 10):
+            table._on_scroll('scroll', 1, 'pages')
+
+    def names(self):
+        return ['create_grid_year', 'load_activities_from_file', 'color_grid',
+                'image_set_tiles_color', 'table_add_row', 'table_clear',
+                'virtual_table_scroll']
+
+
+def measure(stage, repeat):
+    """
+    returns median and min ms over repeat runs and peak KiB of one traced run
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        times.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    stage()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'ms': round(statistics.median(times), 3), 'min_ms': round(min(times), 3),
+            'peak_kb': round(peak / 1024, 1)}
+
+
+def run(directory, repeat=5, stages=None):
+    years = data_years(directory)
+    if not years:
+        raise SystemExit('no activity files in {}'.format(directory))
+    cwd = os.getcwd()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('config.json', 'activity-defaults.csv'):
+        if not os.path.exists(os.path.join(directory, name)):
+            shutil.copy(os.path.join(here, name), directory)
+    faketk.install()
+    os.chdir(directory)
+    try:
+        bench = Stages(years)
+        results = {}
+        for name in stages or bench.names():
+            faketk.calls.clear()
+            results[name] = measure(getattr(bench, name), repeat)
+            results[name]['widget_calls'] = sum(faketk.calls.values()) // (repeat + 1)
+        bench.app.shutdown()
+        return results
+    finally:
+        faketk.clear_pending()
+        os.chdir(cwd)
+
+
+def regressions(results, baseline, threshold):
+    """
+    returns (stage, metric, baseline value, value) exceeding baseline by threshold
+    """
+    found = []
+    for name, result in results.items():
+        for metric in ('ms', 'peak_kb'):
+            base = baseline.get(name, {}).get(metric)
+            if base and result[metric] > base * (1 + threshold):
+                found.append((name, metric, base, result[metric]))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless ui benchmarks')
+    commands = parser.add_subparsers(dest='command')
+    gen_cmd = commands.add_parser('generate', help='write synthetic activity files')
+    gen_cmd.add_argument('directory')
+    gen_cmd.add_argument('--years', nargs=2, type=int, default=[2018, 2018])
+    gen_cmd.add_argument('--per-day', type=int, default=2)
+    gen_cmd.add_argument('--density', type=float, default=0.7)
+    gen_cmd.add_argument('--seed', type=int, default=1)
+    run_cmd = commands.add_parser('run', help='time stages on a data directory')
+    run_cmd.add_argument('directory')
+    run_cmd.add_argument('--repeat', type=int, default=5)
+    run_cmd.add_argument('--stage', nargs='+')
+    run_cmd.add_argument('--baseline')
+    run_cmd.add_argument('--save-baseline')
+    run_cmd.add_argument('--threshold', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        for filename in generate(args.directory, args.years[0], args.years[1],
+                                 args.per_day, args.density, seed=args.seed):
+            print(filename)
+        return 0
+    if args.command != 'run':
+        parser.print_help()
+        return 0
+
+    results = run(args.directory, args.repeat, args.stage)
+    print('{:<28}{:>10}{:>10}{:>12}{:>10}'.format('stage', 'ms', 'min ms',
+                                                  'peak KiB', 'calls'))
+    for name, result in results.items():
+        print('{:<28}{:>10.2f}{:>10.2f}{:>12.1f}{:>10}'.format(
+            name, result['ms'], result['min_ms'], result['peak_kb'],
+            result['widget_calls']))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.threshold)
+        for name, metric, base, value in found:
+            print('regression: {} {} {} -> {}'.format(name, metric, base, value))
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,12 @@
 from tkinter import Canvas, Frame
-import calendar
-from datetime import datetime
+from datetime import date
+import metrics
+from tiletext import TileTextMixin
+import yearlayout
 
 
-class CalendarGrid(Frame):
-    MONTH_RANGE = range(1, 13)
+class CalendarGrid(TileTextMixin, Frame):
+    MONTH_RANGE = yearlayout.MONTH_RANGE
     POS_0 = 1
     
     def __init__(self, parent=None, tile_size=22,
@@ -18,20 +20,38 @@ class CalendarGrid(Frame):
         self._tsepar = separator
         self._date_tile = {}
         self._tile_date = {}
+        # canvas items are created once and moved when year changes
+        self._tiles = []
+        self._separs = []
+        self._layout = None
         self._selected = None
-        self._text = None
+        self._init_tile_text()
 
     def pack(self, **options):
         super().pack(options)
         self._calgrid.pack()
         
+    @metrics.timed('grid.create_grid_year')
     def create_grid_year(self, year):
-        # clear canvas
-        self._calgrid.delete("all")
-        for month in CalendarGrid.MONTH_RANGE:
-            dates_and_tiles = self._create_grid_tiles(year, month)
-            self._create_grid_separ(year, month)
-            self._bind_tile_and_date(dates_and_tiles)
+        """
+        shows year on the grid, first call creates the canvas items,
+        later calls only move, show or hide them
+        """
+        if not self._tiles:
+            self._create_grid_items()
+        self.selected(None)
+        self.remove_text()
+        layout = yearlayout.year_layout(year)
+        if layout is not self._layout:
+            self._move_grid_items(layout)
+            self._layout = layout
+        self._calgrid.itemconfig("tile", fill=self._tbg)
+        self.highlight(())
+        first = date(year, 1, 1).toordinal()
+        self._date_tile.clear()
+        self._tile_date.clear()
+        self._bind_tile_and_date((date.fromordinal(first + i), tile)
+                                 for i, tile in enumerate(self._tiles[:layout.days()]))
             
     def bind_tiles_callback(self, callback=None, event_trigger='<Button-1>'):
         def _callback(event):
@@ -52,85 +72,52 @@ class CalendarGrid(Frame):
         t = self.tile(date)
         self._calgrid.itemconfig(t, fill=color_hex)
 
+    @metrics.timed('grid.set_tiles_color')
+    def set_tiles_color(self, dates_and_colors):
+        itemconfig, date_tile = self._calgrid.itemconfig, self._date_tile
+        for date, color_hex in dates_and_colors:
+            itemconfig(date_tile[date], fill=color_hex)
+
+    @metrics.timed('grid.selected')
     def selected(self, date):
-        if self._selected:
-            self._calgrid.delete(self._selected)
-            self._selected = None
+        # the outline is one line item moved to the selected tile
         tile_id = self._date_tile.get(date, None)
-        if tile_id:
-            coords = self._calgrid.coords(tile_id)
-            # create rectangle around tile from lines
-            self._selected = self._calgrid.create_line(
-                coords[0], coords[1],
-                coords[2], coords[1],
-                coords[2], coords[3],
-                coords[0], coords[3],
-                coords[0], coords[1],
-                fill="green", width=2)
-
-    def set_text_to_tile(self, tile_id, text, offset_x=10, offset_y=8):
-        tile_coords = self._calgrid.coords(tile_id)
-        if self._text is None:
-            pos = tile_coords[0] + offset_x, tile_coords[1] + offset_y
-            # disable state required to disable catching events
-            self._text = self._calgrid.create_text(pos, text=text, state='disabled')
+        if not tile_id:
+            if self._selected:
+                self._calgrid.itemconfig(self._selected, state='hidden')
+            return
+        x0, y0, x1, y1 = self._calgrid.coords(tile_id)
+        points = (x0, y0, x1, y0, x1, y1, x0, y1, x0, y0)
+        if self._selected is None:
+            self._selected = self._calgrid.create_line(*points, fill="green", width=2)
         else:
-            self._calgrid.coords(self._text, (tile_coords[0], tile_coords[1]))
+            self._calgrid.coords(self._selected, *points)
+            self._calgrid.itemconfig(self._selected, state='normal')
 
-    def remove_text(self):
-        if self._text:
-            self._calgrid.delete(self._text)
-            self._text = None
+    @metrics.timed('grid.highlight')
+    def highlight(self, dates, outline='#0050ff'):
+        """
+        outlines tiles of dates, replaces the previous highlight
+        """
+        canvas = self._calgrid
+        canvas.itemconfig('highlight', outline=self._toutline, width=1)
+        canvas.dtag('highlight', 'highlight')
+        for date in dates:
+            tile_id = self._date_tile.get(date)
+            if tile_id:
+                canvas.addtag_withtag('highlight', tile_id)
+        canvas.itemconfig('highlight', outline=outline, width=2)
 
     # private
     def _weeknr_weekday_date(self, year, month):
-        c = calendar.Calendar()
-        return [(d.isocalendar()[1], d.weekday(), d)
-                for d in c.itermonthdates(year, month)]
+        return yearlayout.weeknr_weekday_date(year, month)
 
     def _pos_tile_date(self, year, month):
-        """
-        calculates widget grid positions by returning (row,col,date)
-        triple for given month, one week per column
-        """
-        for (week_nr, week_day, date) in self._weeknr_weekday_date(year, month):
-            if (month == date.month):
-                if (month == 1 and (week_nr == 52 or week_nr == 53)):
-                    yield (0, week_day, date)
-                elif (month == 12 and week_nr == 1):
-                    yield (53, week_day, date)
-                else:
-                    yield (week_nr, week_day, date)
+        return yearlayout.pos_tile_date(year, month)
 
     def _pos_separ(self, year, month):
-        last_day = calendar.monthrange(year, month)[1]
-        first_date = datetime(year=year, month=month, day=1)
-        last_date = datetime(year=year, month=month, day=last_day)
-        first_weekday, last_weekday = first_date.weekday(), last_date.weekday()
-        fnr = first_date.isocalendar()[1]
-        lnr = last_date.isocalendar()[1]
-        first_weeknr = 0 if (fnr == 52 or fnr == 53) else fnr
-        last_weeknr = 53 if lnr == 1 else lnr
-        points = []
-        if first_weekday == 0:
-            first_pos = (first_weeknr, 0)
-            points.extend(first_pos)
-        else:
-            first_pos = (first_weeknr + 1, 0)
-            points.extend(first_pos)
-            points.extend((first_weeknr + 1, first_weekday))
-            points.extend((first_weeknr, first_weekday))
-        points.extend((first_weeknr, 7))
-        if last_weekday == 6:
-            points.extend((last_weeknr + 1, 7))
-        else:
-            points.extend((last_weeknr, 7))
-            points.extend((last_weeknr, last_weekday + 1))
-            points.extend((last_weeknr + 1, last_weekday + 1))
-        points.extend((last_weeknr + 1, 0))
-        points.extend(first_pos)
-        return points
-            
+        return yearlayout.pos_separ(year, month)
+
     def _create_tile(self, x0, y0, x1, y1):
         tile_id = self._calgrid.create_rectangle(x0, y0, x1, y1, outline=self._toutline,
                                                  tags=("tile",), activeoutline='green',
@@ -139,20 +126,30 @@ class CalendarGrid(Frame):
         self._calgrid.addtag_withtag(str(tile_id), tile_id)
         return tile_id
 
-    def _create_grid_tiles(self, year, month):
-        dates_and_tiles = []
-        for col, row, date in self._pos_tile_date(year, month):
-            tile = self._create_tile(CalendarGrid.POS_0 + self._tsize * col,
+    def _tile_origin(self, tile_id):
+        return self._calgrid.coords(tile_id)[:2]
+
+    def _create_grid_items(self):
+        for _ in range(yearlayout.DAYS_MAX):
+            self._tiles.append(self._create_tile(0, 0, 0, 0))
+        for _ in CalendarGrid.MONTH_RANGE:
+            self._separs.append(self._calgrid.create_line(0, 0, 0, 0, tags=("separ",)))
+
+    def _move_grid_items(self, layout):
+        for i, tile in enumerate(self._tiles):
+            if i < layout.days():
+                col, row = layout.tiles[i]
+                self._calgrid.coords(tile,
+                                     CalendarGrid.POS_0 + self._tsize * col,
                                      CalendarGrid.POS_0 + self._tsize * row,
                                      CalendarGrid.POS_0 + self._tsize * (col + 1),
                                      CalendarGrid.POS_0 + self._tsize * (row + 1))
-            dates_and_tiles.append((date, tile))
-        return dates_and_tiles
-
-    def _create_grid_separ(self, year, month):
-        coords = [CalendarGrid.POS_0 + self._tsize * p
-                  for p in self._pos_separ(year, month)]
-        return self._calgrid.create_line(coords, tags=("separ",))
+                self._calgrid.itemconfig(tile, state='normal')
+            else:
+                self._calgrid.itemconfig(tile, state='hidden')
+        for separ, points in zip(self._separs, layout.separators):
+            self._calgrid.coords(separ, [CalendarGrid.POS_0 + self._tsize * p
+                                         for p in points])
 
     def _bind_tile_and_date(self, dates_and_tiles):
         for date, tile in dates_and_tiles:
@@ -10,3 +10,61 @@ def yprpb_to_rgb(y, pb, pr) -> tuple:
 
 def rgb_to_hex(rgb: tuple) -> str:
     return '#%02x%02x%02x' % tuple(rgb)
+
+
+def hex_to_rgb(color_hex: str) -> tuple:
+    return tuple(int(color_hex[i:i + 2], 16) for i in (1, 3, 5))
+
+
+class ColorRamp:
+    """
+    Precompiled duration -> color lookup.
+    thresholds are minutes, each one starts the color at the same index.
+    A threshold lower than one before it (like "99:99", which parses to 0)
+    takes over all durations from the preceding threshold on.
+    """
+
+    def __init__(self, thresholds, colors_rgb):
+        # prefix max gives the bucket a linear scan with break would pick
+        limits = []
+        for minutes in thresholds:
+            limits.append(max(minutes, limits[-1]) if limits else minutes)
+        self._rgb = tuple(tuple(rgb) for rgb in colors_rgb)
+        self._palette = tuple(rgb_to_hex(rgb) for rgb in self._rgb)
+        self._cap = limits[-1]
+        # bucket index by minute for every duration below cap
+        lut = bytearray(self._cap + 1)
+        bucket = 0
+        for minutes in range(self._cap + 1):
+            while bucket + 1 < len(limits) and limits[bucket + 1] <= minutes:
+                bucket += 1
+            lut[minutes] = bucket
+        self._lut = bytes(lut)
+
+    def bucket(self, minutes):
+        return self._lut[min(max(minutes, 0), self._cap)]
+
+    def buckets(self, minutes_list):
+        lut, cap = self._lut, self._cap
+        return bytes(lut[m if m < cap else cap] for m in minutes_list)
+
+    def rgb(self, minutes):
+        return self._rgb[self.bucket(minutes)]
+
+    def color(self, minutes):
+        return self._palette[self.bucket(minutes)]
+
+    def colors(self, minutes_list):
+        """
+        returns hex colors for a sequence of minute totals
+        """
+        palette = self._palette
+        return [palette[b] for b in self.buckets(minutes_list)]
+
+    @property
+    def palette(self):
+        return self._palette
+
+    @property
+    def min_rgb(self):
+        return self._rgb[0]
@@ -1,14 +1,59 @@
 import json
 import csv
-from timedelta_util import timedelta_from_hh_mm
+import os
+import time
+from datetime import timedelta
+from types import MappingProxyType
+from color_util import ColorRamp
+from timedelta_util import minutes_from_hh_mm
+
+
+class ConfigSnapshot:
+    """
+    config.json and activity defaults compiled into read-only structures
+    """
+
+    def __init__(self, app, act_defaults, color_ramp, mtimes, version):
+        self.app = MappingProxyType(app)
+        self.headers = tuple(act_defaults[0])
+        self.data = tuple(tuple(row) for row in act_defaults[1:])
+        self.sports = tuple(row[0] for row in self.data)
+        # skip 'sport' header, nested dict sport_header:{csv_header:csv_value}
+        # ex, {run: {time: 00:30, intensity: 3}, bike:...}
+        self.by_sport = MappingProxyType(
+            {row[0]: MappingProxyType(dict(zip(self.headers[1:], row[1:])))
+             for row in self.data})
+        self.color_ramp = color_ramp
+        self.mtimes = mtimes
+        self.version = version
 
 
 class Config:
+    """
+    Compiles config files once, they are compiled again when their
+    modification time changes, checked at most every reload_interval seconds
+    """
 
-    def __init__(self):
-        self._config = self.read_config('config.json')
-        ad_filename = self._config['app']['activity_defaults']
-        self._act_defaults = self.read_activity_defaults(ad_filename)
+    def __init__(self, config_file='config.json', reload_interval=1.0):
+        self._config_file = config_file
+        self._reload_interval = reload_interval
+        self._snapshot = self.compile(version=1)
+        self._checked = time.monotonic()
+
+    def compile(self, version):
+        config = self.read_config(self._config_file)
+        ad_filename = config['app']['activity_defaults']
+        mtimes = self._mtimes((self._config_file, ad_filename))
+        return ConfigSnapshot(config['app'], self.read_activity_defaults(ad_filename),
+                              self.compile_color_ramp(config['app']['colors_rgb']),
+                              mtimes, version)
+
+    @property
+    def version(self):
+        """
+        increases with every reload
+        """
+        return self._current().version
 
     def read_config(self, config_file):
         with open(config_file) as json_file:
@@ -18,42 +63,119 @@ class Config:
         with open(filename, 'r') as f:
             return [list(map(str.strip, row)) for row in list(csv.reader(f, delimiter='|'))]
 
+    def _current(self):
+        now = time.monotonic()
+        if now - self._checked >= self._reload_interval:
+            self._checked = now
+            snapshot = self._snapshot
+            if self._mtimes(snapshot.mtimes) != snapshot.mtimes:
+                try:
+                    self._snapshot = self.compile(snapshot.version + 1)
+                except (OSError, ValueError, KeyError):
+                    # keep last good config while a file is being edited
+                    pass
+        return self._snapshot
+
+    def _mtimes(self, filenames):
+        mtimes = {}
+        for filename in filenames:
+            try:
+                mtimes[filename] = os.stat(filename).st_mtime_ns
+            except OSError:
+                mtimes[filename] = None
+        return mtimes
+
+    def compile_color_ramp(self, dur_col):
+        color_keys = sorted(dur_col.keys())
+        return ColorRamp([minutes_from_hh_mm(dur) for dur in color_keys],
+                         # list of str -> list of int
+                         [list(map(int, dur_col[dur])) for dur in color_keys])
+
     def activity_filename(self, date):
-        return "{}_{}.csv".format(self._config['app']['csv_prefix'],
+        return "{}_{}.csv".format(self._current().app['csv_prefix'],
                                   date.year)
 
     def backup_filename(self, date):
-        return "{}_{}-{}-{}.csv".format(self.backup_path,
-                                        self._config['app']['csv_prefix'],
-                                        date.year,
-                                        date.month,
-                                        date.day)
+        return "{}{}_{}-{:02d}-{:02d}.csv".format(self.backup_path,
+                                                  self._current().app['csv_prefix'],
+                                                  date.year,
+                                                  date.month,
+                                                  date.day)
     
     def determine_color(self, td):
         """
         takes timedelta and determines color based on config file
         """
-        dur_col = self._config['app']['colors_rgb']
-        color_keys = sorted(dur_col.keys())
-        matching_key = color_keys[0]
-        for dur in color_keys:
-            if timedelta_from_hh_mm(dur) <= td:
-                matching_key = dur
-            else:
-                break
-        colors = dur_col[matching_key]
-        # list of str -> list of int
-        return list(map(int, colors))
+        return list(self._current().color_ramp.rgb(td // timedelta(minutes=1)))
+
+    @property
+    def color_ramp(self):
+        return self._current().color_ramp
 
     @property
     def min_color(self):
-        dur_col = self._config['app']['colors_rgb']
-        color_keys = sorted(dur_col.keys())
-        return list(map(int, dur_col[color_keys[0]]))
+        return list(self._current().color_ramp.min_rgb)
+
+    @property
+    def storage(self):
+        """
+        'csv' for per-year files or 'sqlite'
+        """
+        return self._current().app.get('storage', 'csv')
+
+    @property
+    def sqlite_filename(self):
+        return self._current().app.get('sqlite_filename', 'activities.db')
+
+    @property
+    def csv_prefix(self):
+        return self._current().app['csv_prefix']
 
     @property
     def backup_path(self):
-        return self._config['app']['backup_path']
+        return self._current().app['backup_path']
+
+    @property
+    def journal_max_size(self):
+        return int(self._current().app.get('journal_max_size', 64 * 1024))
+
+    @property
+    def year_cache_max_bytes(self):
+        return int(self._current().app.get('year_cache_max_mb', 64)) * 1024 * 1024
+
+    @property
+    def backup_interval_ms(self):
+        return int(self._current().app.get('backup_interval_min', 30)) * 60 * 1000
+
+    @property
+    def sync_url(self):
+        return self._current().app.get('sync_url', 'http://127.0.0.1:8765')
+
+    @property
+    def sync_state_filename(self):
+        return self._current().app.get('sync_state', 'sync_state.json')
+
+    @property
+    def search_index_filename(self):
+        return self._current().app.get('search_index', 'search_index.json')
+
+    @property
+    def track_path(self):
+        return self._current().app.get('track_path', 'tracks')
+
+    @property
+    def grid_backend(self):
+        """
+        'canvas' draws a canvas item per tile, 'image' one image
+        """
+        return self._current().app.get('grid_backend', 'canvas')
+
+    @property
+    def years_span(self):
+        """
+        number of years shown stacked, 5 to 20
+        """
+        return min(max(int(self._current().app.get('years_span', 10)), 5), 20)
 
     @property
     def max_table_size(self):
@@ -61,23 +183,16 @@ class Config:
 
     @property
     def activity_defaults_data(self):
-        return self._act_defaults[1:]
+        return self._current().data
 
     @property
     def activity_defaults_headers(self):
-        return [header.strip() for header in self._act_defaults[0]]
+        return self._current().headers
 
     @property
     def activity_defaults_sports(self):
-        return [ad[0] for ad in self.activity_defaults_data]
+        return self._current().sports
 
     @property
     def activity_defaults_by_sport(self):
-        # skip 'sport' header and trim
-        header_list = [h.strip() for h in self.activity_defaults_headers[1:]]
-        # create nested dict
-        # sport_header:{csv_header:csv_value}
-        # ex, {run: {time: 00:30, intensity: 3}, bike:...}
-        return {row[0]: dict(zip(header_list, [r.strip() for r in row[1:]]))
-                for row in self.activity_defaults_data}
-
+        return self._current().by_sport
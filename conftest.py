@@ -0,0 +1,31 @@
+import importlib
+import sys
+import pytest
+import faketk
+
+
+@pytest.fixture(scope='module')
+def fake_tk():
+    """
+    installs the fake tkinter widgets for one test module and returns an
+    import function for modules that have to see them, the real widgets
+    and previously imported modules are restored afterwards
+    """
+    faketk.install()
+    previous = {}
+
+    def load(name):
+        if name not in previous:
+            previous[name] = sys.modules.pop(name, None)
+        return importlib.import_module(name)
+
+    try:
+        yield load
+    finally:
+        for name, module in previous.items():
+            sys.modules.pop(name, None)
+            if module is not None:
+                sys.modules[name] = module
+        faketk.uninstall()
+        faketk.clear_pending()
+        faketk.calls.clear()
@@ -10,3 +10,16 @@ def roll_year(dt: date, year: int) -> date:
 
 def date_from_str(date_string: str) -> date:
     return datetime.strptime(date_string, "%Y-%m-%d").date()
+
+
+def ordinal_from_str(date_string: str) -> int:
+    """
+    faster equivalent of date_from_str(date_string).toordinal()
+    """
+    try:
+        year, month, day = date_string.split('-')
+        if len(year) != 4:
+            raise ValueError(date_string)
+        return date(int(year), int(month), int(day)).toordinal()
+    except (TypeError, ValueError):
+        return date_from_str(date_string).toordinal()
@@ -0,0 +1,148 @@
+"""
+Typed activity columns for analysis, one .npy file per column:
+
+    python export.py export/ --years 2015 2024 --npz activities.npz
+
+    day.npy          day ordinals (date.toordinal())
+    date.npy         the same days as datetime64[D]
+    sport.npy        sport codes, index into sports.npy
+    sports.npy       sport names
+    minutes.npy      duration in minutes
+    distance.npy     distance
+    intensity.npy    intensity
+
+Rows of all exported years are in day order. The files are written
+from the store arrays in the numpy .npy format without numpy, a
+notebook opens them without parsing or copying:
+
+    minutes = np.load('export/minutes.npy', mmap_mode='r')
+
+The .npz archive holds the same members uncompressed, np.load reads
+it without a decompress step but does not memory-map it.
+"""
+from array import array
+from datetime import date
+import os
+import sys
+import zipfile
+from file_util import atomic_write
+from model import ActivityStore
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# header end is padded so array data starts aligned for mmap
+NPY_ALIGN = 64
+UNIX_EPOCH = date(1970, 1, 1).toordinal()
+# numpy kind of array typecodes
+_KINDS = {'b': 'i', 'h': 'i', 'i': 'i', 'l': 'i', 'q': 'i',
+          'B': 'u', 'H': 'u', 'I': 'u', 'L': 'u', 'Q': 'u', 'f': 'f', 'd': 'f'}
+
+
+def npy_header(descr, shape):
+    """
+    returns .npy version 1.0 header for a c-ordered array
+    """
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': {}, }}".format(
+        descr, repr(tuple(shape)))
+    size = len(NPY_MAGIC) + 2 + len(header) + 1
+    header += ' ' * (-size % NPY_ALIGN) + '\n'
+    return NPY_MAGIC + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+def npy_bytes(values, descr=None):
+    """
+    returns (header, data) of a 1-d array, descr defaults to the
+    little-endian type of the array's typecode
+    """
+    if descr is None:
+        descr = '<{}{}'.format(_KINDS[values.typecode], values.itemsize)
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return npy_header(descr, (len(values),)), values
+
+
+def npy_strings(strings):
+    """
+    returns (header, data) of a fixed width unicode array
+    """
+    width = max([len(s) for s in strings] + [1])
+    data = b''.join(s.ljust(width, '\0').encode('utf-32-le') for s in strings)
+    return npy_header('<U{}'.format(width), (len(strings),)), data
+
+
+def columns(store):
+    """
+    returns [(name, (header, data))] of the store columns
+    """
+    days = store.days
+    return [
+        ('day', npy_bytes(days)),
+        ('date', npy_bytes(array('q', [d - UNIX_EPOCH for d in days]), '<M8[D]')),
+        ('sport', npy_bytes(store.sports)),
+        ('sports', npy_strings(store.sport_names)),
+        ('minutes', npy_bytes(store.minutes)),
+        ('distance', npy_bytes(store.distance)),
+        ('intensity', npy_bytes(store.intensity)),
+    ]
+
+
+def merged_store(storage, years):
+    """
+    returns (store of years with sport codes shared across years,
+    dates of rows that do not convert and are exported as 0)
+    """
+    raw_dates = []
+
+    def values():
+        for year in sorted(years):
+            store = storage.read_year(year)
+            raw_dates.extend(store.raw_dates())
+            yield from store.values()
+    return ActivityStore.from_values(values()), raw_dates
+
+
+def export_npy(store, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, (header, data) in columns(store):
+        with atomic_write(os.path.join(directory, name + '.npy'), 'wb') as f:
+            f.write(header)
+            f.write(data)
+
+
+def export_npz(store, filename):
+    with atomic_write(filename, 'wb') as f:
+        with zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as npz:
+            for name, (header, data) in columns(store):
+                npz.writestr(name + '.npy', header + bytes(data))
+
+
+def main(argv=None):
+    import argparse
+    from config import Config
+    from storage import open_storage
+    parser = argparse.ArgumentParser(description='Export activity columns as .npy files')
+    parser.add_argument('directory', nargs='?', default='export')
+    parser.add_argument('--years', type=int, nargs=2, metavar=('FIRST', 'LAST'))
+    parser.add_argument('--npz', help='also write columns to this .npz file')
+    args = parser.parse_args(argv)
+
+    cfg = Config()
+    storage = open_storage(cfg)
+    try:
+        years = storage.years()
+        if args.years:
+            years = [y for y in years if args.years[0] <= y <= args.years[1]]
+        store, raw_dates = merged_store(storage, years)
+    finally:
+        storage.close()
+    if raw_dates:
+        print('values on {} do not convert and are exported as 0'.format(
+            ', '.join(map(str, raw_dates))), file=sys.stderr)
+    export_npy(store, args.directory)
+    if args.npz:
+        export_npz(store, args.npz)
+    print('{} activities of {} years'.format(len(store), len(years)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Recording stand-ins for the tkinter widgets used by the app, so ui code
+can run without a display:
+
+    import faketk
+    faketk.install()
+    from gui import Gui   # imported after install()
+
+Every widget method call is counted in faketk.calls ('Canvas.itemconfig': n),
+after() callbacks are queued until run_pending() is called.
+"""
+from collections import Counter
+import itertools
+import tkinter
+from tkinter import messagebox
+
+calls = Counter()
+_pending = []
+# replaced tkinter names and their real values, kept by install()
+_originals = {}
+
+
+def install():
+    """
+    replaces tkinter widgets with the fakes, modules importing
+    tkinter names must be imported afterwards
+    """
+    for name, fake in (('Tk', Tk), ('Frame', Frame), ('Toplevel', Toplevel),
+                       ('Canvas', Canvas),
+                       ('Entry', Entry), ('Label', Label), ('Button', Button),
+                       ('OptionMenu', OptionMenu), ('Scrollbar', Scrollbar),
+                       ('StringVar', StringVar), ('PhotoImage', PhotoImage),
+                       ('Grid', Grid)):
+        _originals.setdefault((tkinter, name), getattr(tkinter, name))
+        setattr(tkinter, name, fake)
+    for name in ('askokcancel', 'showerror'):
+        _originals.setdefault((messagebox, name), getattr(messagebox, name))
+    messagebox.askokcancel = lambda *args, **kwargs: True
+    messagebox.showerror = lambda *args, **kwargs: calls.update(['showerror'])
+
+
+def uninstall():
+    """
+    puts the real tkinter widgets back, modules imported after install()
+    keep the fakes
+    """
+    for (module, name), value in _originals.items():
+        setattr(module, name, value)
+    _originals.clear()
+
+
+def run_pending(max_ms=100, until=None):
+    """
+    runs queued after() callbacks with a delay up to max_ms, including
+    ones they schedule, longer timers stay queued; stops early once
+    until() is true, returns number of callbacks run
+    """
+    count = 0
+    while True:
+        ready = [job for job in _pending if job[0] <= max_ms]
+        if not ready:
+            return count
+        for job in ready:
+            _pending.remove(job)
+            job[1]()
+            count += 1
+            if until and until():
+                return count
+
+
+def clear_pending():
+    del _pending[:]
+
+
+class Widget:
+
+    def __init__(self, parent=None, *args, **options):
+        self._parent = parent
+        self._options = dict(options)
+
+    def _record(self, name):
+        calls[type(self).__name__ + '.' + name] += 1
+
+    # geometry, bindings and the like have no effect here, they are only counted
+    def pack(self, *args, **options):
+        self._record('pack')
+
+    def grid(self, *args, **options):
+        self._record('grid')
+
+    def grid_forget(self):
+        self._record('grid_forget')
+
+    def grid_remove(self):
+        self._record('grid_remove')
+
+    def place(self, *args, **options):
+        self._record('place')
+
+    def update_idletasks(self):
+        self._record('update_idletasks')
+
+    def bind(self, *args):
+        self._record('bind')
+
+    def tag_bind(self, *args):
+        self._record('tag_bind')
+
+    def protocol(self, *args):
+        self._record('protocol')
+
+    def destroy(self):
+        self._record('destroy')
+
+    def mainloop(self):
+        run_pending()
+
+    def config(self, **options):
+        calls[type(self).__name__ + '.config'] += 1
+        self._options.update(options)
+
+    configure = config
+
+    def __getitem__(self, key):
+        return self._options.get(key)
+
+    def after(self, ms, callback=None, *args):
+        calls['after'] += 1
+        job = (ms, lambda: callback(*args))
+        _pending.append(job)
+        return job
+
+    def after_idle(self, callback, *args):
+        return self.after(0, callback, *args)
+
+    def after_cancel(self, job):
+        if job in _pending:
+            _pending.remove(job)
+
+
+class Tk(Widget):
+    pass
+
+
+class Frame(Widget):
+    pass
+
+
+class Toplevel(Widget):
+
+    def title(self, text):
+        self._record('title')
+
+
+class Label(Widget):
+    pass
+
+
+class Button(Widget):
+    pass
+
+
+class Scrollbar(Widget):
+
+    def __init__(self, parent=None, **options):
+        Widget.__init__(self, parent, **options)
+        self.position = (0.0, 1.0)
+
+    def set(self, first, last):
+        self._record('set')
+        self.position = (float(first), float(last))
+
+
+class Menu(Widget):
+
+    def delete(self, first, last=None):
+        self._record('delete')
+
+    def add_command(self, **options):
+        self._record('add_command')
+
+
+class OptionMenu(Widget):
+
+    def __init__(self, parent, variable, *values, **options):
+        Widget.__init__(self, parent, **options)
+        self._options['menu'] = Menu(self)
+
+
+class PhotoImage:
+
+    def __init__(self, master=None, **options):
+        self._options = dict(options)
+
+    def configure(self, **options):
+        calls['PhotoImage.configure'] += 1
+        self._options.update(options)
+
+    def put(self, data, to=None):
+        calls['PhotoImage.put'] += 1
+
+
+class Grid:
+
+    @staticmethod
+    def rowconfigure(*args, **options):
+        calls['Grid.rowconfigure'] += 1
+
+    @staticmethod
+    def columnconfigure(*args, **options):
+        calls['Grid.columnconfigure'] += 1
+
+
+class StringVar:
+
+    def __init__(self, master=None, value=''):
+        self._value = value
+        self._traces = []
+
+    def set(self, value):
+        self._value = value
+        for callback in self._traces:
+            callback()
+
+    def get(self):
+        return self._value
+
+    def trace_add(self, mode, callback):
+        self._traces.append(callback)
+
+
+class Entry(Widget):
+
+    def __init__(self, parent=None, textvariable=None, **options):
+        Widget.__init__(self, parent, **options)
+        self._var = textvariable or StringVar()
+
+    def get(self):
+        return self._var.get()
+
+    def delete(self, first, last=None):
+        calls['Entry.delete'] += 1
+        self._var.set('')
+
+    def insert(self, index, text):
+        calls['Entry.insert'] += 1
+        self._var.set(self._var.get() + str(text))
+
+
+class Canvas(Widget):
+    """
+    keeps items with their kind, coords, options and tags
+    """
+
+    def __init__(self, parent=None, **options):
+        Widget.__init__(self, parent, **options)
+        self.items = {}
+        self._ids = itertools.count(1)
+
+    def _create(self, kind, coords, options):
+        calls['Canvas.create_' + kind] += 1
+        item = next(self._ids)
+        if len(coords) == 1:
+            coords = coords[0]
+        tags = options.pop('tags', ())
+        self.items[item] = {'kind': kind, 'coords': list(coords), 'options': options,
+                            'tags': (tags,) if isinstance(tags, str) else tuple(tags)}
+        return item
+
+    def create_rectangle(self, *coords, **options):
+        return self._create('rectangle', coords, options)
+
+    def create_line(self, *coords, **options):
+        return self._create('line', coords, options)
+
+    def create_text(self, *coords, **options):
+        return self._create('text', coords, options)
+
+    def create_image(self, *coords, **options):
+        return self._create('image', coords, options)
+
+    def find_withtag(self, tag_or_id):
+        if isinstance(tag_or_id, int):
+            return (tag_or_id,) if tag_or_id in self.items else ()
+        return tuple(item for item, value in self.items.items()
+                     if tag_or_id == 'all' or tag_or_id in value['tags'])
+
+    def coords(self, tag_or_id, *coords):
+        calls['Canvas.coords'] += 1
+        items = self.find_withtag(tag_or_id)
+        if not coords:
+            return list(self.items[items[0]]['coords']) if items else []
+        if len(coords) == 1:
+            coords = coords[0]
+        for item in items:
+            self.items[item]['coords'] = list(coords)
+
+    def itemconfig(self, tag_or_id, **options):
+        calls['Canvas.itemconfig'] += 1
+        tags = options.pop('tags', None)
+        for item in self.find_withtag(tag_or_id):
+            self.items[item]['options'].update(options)
+            if tags is not None:
+                self.items[item]['tags'] = ((tags,) if isinstance(tags, str)
+                                            else tuple(tags))
+
+    itemconfigure = itemconfig
+
+    def addtag_withtag(self, tag, tag_or_id):
+        calls['Canvas.addtag_withtag'] += 1
+        for item in self.find_withtag(tag_or_id):
+            self.items[item]['tags'] += (tag,)
+
+    def dtag(self, tag_or_id, tag=None):
+        calls['Canvas.dtag'] += 1
+        tag = tag_or_id if tag is None else tag
+        for item in self.find_withtag(tag_or_id):
+            self.items[item]['tags'] = tuple(t for t in self.items[item]['tags']
+                                             if t != tag)
+
+    def delete(self, tag_or_id):
+        calls['Canvas.delete'] += 1
+        for item in self.find_withtag(tag_or_id):
+            del self.items[item]
@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+import os
+
+
+@contextmanager
+def atomic_write(filename, mode='w'):
+    """
+    writes to a temp file next to filename and renames it over filename
+    when the block succeeds, so readers never see a partially written file
+    """
+    # tempfile is slow to import and only needed once something is saved
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp',
+                                        prefix='.' + os.path.basename(filename))
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filename):
+            os.chmod(tmp_filename, os.stat(filename).st_mode)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.unlink(tmp_filename)
+        raise
@@ -1,4 +1,5 @@
-from tkinter import Button, Frame, Label, OptionMenu, StringVar, Tk
+from tkinter import (Button, Entry, Frame, Label, OptionMenu, PhotoImage, StringVar, Tk,
+                     Toplevel)
 from tkinter import messagebox
 from calendargrid import CalendarGrid
 from table import Table
@@ -6,28 +7,52 @@ from table import Table
 
 class Gui:
 
-    def __init__(self, year, sports, headers, calgrid_bg_tile_color):
+    def __init__(self, year, sports, headers, calgrid_bg_tile_color,
+                 grid_backend='canvas'):
         self._main_window = Tk()
         self._main_window.protocol("WM_DELETE_WINDOW", self.on_closing)
-        self._init_layout(year, sports, headers, calgrid_bg_tile_color)
+        self._on_exit_callback = None
+        self._metrics_lbl = None
+        self._years_window = None
+        self._years_grid = None
+        self._init_layout(year, sports, headers, calgrid_bg_tile_color, grid_backend)
         
     def on_closing(self):
         if messagebox.askokcancel("Quit", "Do you want to quit?"):
-            self._main_window.destroy()
+            close = True
+            try:
+                if self._on_exit_callback:
+                    close = self._on_exit_callback() is not False
+            finally:
+                # a failing exit callback must not keep the window open
+                if close:
+                    self._main_window.destroy()
 
     def loop(self):
         self._main_window.mainloop()
 
+    def after(self, ms, callback):
+        """
+        runs callback on the ui thread after ms milliseconds
+        """
+        return self._main_window.after(ms, callback)
+
+    def update_idletasks(self):
+        """
+        runs pending redraws now
+        """
+        self._main_window.update_idletasks()
+
     #########################################################################
     # api
     #########################################################################
 
     def load_cal_grid(self, year):
-        if self._cal_grid:
-            self._cal_grid.destroy()
-        self._cal_grid = CalendarGrid(self._cont_calendar)
+        # reuses canvas items and tile bindings of the current grid
         self._cal_grid.create_grid_year(year)
-        self._cal_grid.pack(padx=20, pady=20)
+        self._summary_year = year
+        if self._summary_chart:
+            self._summary_chart.set_year(year)
 
     def select_date(self, date):
         """
@@ -44,6 +69,12 @@ class Gui:
     def set_save_status_label(self, text, color='green'):
         self._sync_save_status.config(text=text, fg=color)
 
+    def show_error(self, title, text):
+        messagebox.showerror(title, text)
+
+    def confirm(self, title, text):
+        return messagebox.askokcancel(title, text)
+
     def add_activity(self, *values):
         """
         fills new column with values
@@ -52,10 +83,9 @@ class Gui:
 
     def load_activities(self, activitity_list):
         """
-        loads activity into table
+        replaces activities in table with activity_list in one pass
         """
-        for activitity in activitity_list:
-            self._table.add_row(activitity)
+        self._table.replace_rows(activitity_list)
 
     def remove_activity(self, activity_index):
         """
@@ -74,13 +104,98 @@ class Gui:
         sets color to calendargrid field by date
         """
         self._cal_grid.set_tile_color_rgb(date, color_rgb)
-        
+
+    def show_summary(self, week_minutes, month_minutes):
+        """
+        redraws summary chart from totals per grid week column and month,
+        the chart is created with the first summary
+        """
+        if self._summary_chart is None:
+            from summarychart import SummaryChart
+            self._summary_chart = SummaryChart(self._cont_summary)
+            self._summary_chart.pack()
+            self._summary_chart.set_year(self._summary_year)
+        self._summary_chart.show(week_minutes, month_minutes)
+
+    def hover_date(self, tile_id, text):
+        """
+        shows text over calendargrid tile
+        """
+        self._cal_grid.hover(tile_id, text)
+
+    def color_dates(self, colors_by_date):
+        """
+        sets colors to calendargrid fields from {date: color} mapping
+        """
+        self._cal_grid.set_tiles_color(colors_by_date.items())
+
+    def show_route(self, png_data):
+        """
+        shows route thumbnail of the selected day, None hides it
+        """
+        if png_data is None:
+            self._route_image = None
+            self._route_lbl.config(image='')
+            self._route_lbl.grid_remove()
+        else:
+            self._route_image = PhotoImage(data=png_data)
+            self._route_lbl.config(image=self._route_image)
+            self._route_lbl.grid()
+
+    def show_metrics(self, text):
+        """
+        shows text in a label over the top right corner of the window
+        """
+        if self._metrics_lbl is None:
+            self._metrics_lbl = Label(self._main_window, justify='left', anchor='nw',
+                                      font=('Courier', 8), bg='#ffffe0')
+            self._metrics_lbl.place(relx=1.0, rely=0.0, anchor='ne')
+        self._metrics_lbl.config(text=text)
+
+    def show_years(self, first_year, last_year, palette, dates_and_buckets, tile_bg):
+        """
+        shows years stacked in a separate window, dates colored by
+        palette index from dates_and_buckets
+        """
+        if self._years_window is None:
+            self._years_window = Toplevel(self._main_window)
+            self._years_window.protocol("WM_DELETE_WINDOW", self._close_years)
+            # imported on first open, not at startup
+            from multiyeargrid import MultiYearGrid
+            self._years_grid = MultiYearGrid(self._years_window, palette, tile_bg=tile_bg)
+            self._years_grid.pack(padx=20, pady=20)
+        self._years_window.title('{} - {}'.format(first_year, last_year))
+        self._years_grid.show_years(first_year, last_year)
+        self._years_grid.set_palette(palette)
+        self._years_grid.set_buckets(dates_and_buckets)
+
+    def highlight_dates(self, dates):
+        """
+        outlines calendargrid fields of dates, replaces previous highlight
+        """
+        self._cal_grid.highlight(dates)
+
+    def search_text(self):
+        return self._search_entry.get()
+
     def workout_type(self):
         """
         returns workout type from dropdown with corresponding default values
         """
         return self._workout_choice.get()
 
+    def set_sports(self, sports):
+        """
+        replaces choices of the sport dropdown, keeps selection if still present
+        """
+        menu = self._workout_type['menu']
+        menu.delete(0, 'end')
+        for sport in sports:
+            menu.add_command(label=sport,
+                             command=lambda s=sport: self._workout_choice.set(s))
+        if sports and self._workout_choice.get() not in sports:
+            self._workout_choice.set(sports[0])
+
     def workout_selected(self):
         """
         returns index of selected workout from table
@@ -108,6 +223,12 @@ class Gui:
     def enable_add(self):
         self._add_btn.config(state="normal")
 
+    def disable_save(self):
+        self._save_btn.config(state="disabled")
+
+    def enable_save(self):
+        self._save_btn.config(state="normal")
+
     #########################################################################
     # callbacks
     #########################################################################
@@ -121,6 +242,16 @@ class Gui:
     def on_save(self, callback):
         self._save_btn.config(command=callback)
 
+    def on_sync(self, callback):
+        self._sync_btn.config(command=callback)
+
+    def on_years(self, callback):
+        self._years_btn.config(command=callback)
+
+    def on_search(self, callback):
+        self._search_btn.config(command=callback)
+        self._search_entry.bind('<Return>', lambda _: callback())
+
     def on_select_date(self, callback):
         self._cal_grid.bind_tiles_callback(callback, event_trigger='<Button-1>')
 
@@ -133,6 +264,13 @@ class Gui:
     def on_workout_type_selected(self, callback):
         pass
 
+    def on_exit(self, callback):
+        """
+        callback runs before the window is destroyed, returning False
+        keeps the window open
+        """
+        self._on_exit_callback = callback
+
     def on_next_year(self, callback):
         self._next_btn.config(command=callback)
 
@@ -143,7 +281,7 @@ class Gui:
     # init
     #########################################################################
 
-    def _init_layout(self, year, sports, headers, calgrid_bg_tile_color):
+    def _init_layout(self, year, sports, headers, calgrid_bg_tile_color, grid_backend):
         # top level
         grid_container = Frame(self._main_window)
         grid_container.pack(fill='both', expand=True, padx=20)
@@ -163,18 +301,34 @@ class Gui:
         self._cont_calendar = Frame(grid_container)
         self._cont_calendar.grid(row=1, column=1, columnspan=20, sticky='nsew')
 
-        self._cal_grid = CalendarGrid(self._cont_calendar, tile_bg=calgrid_bg_tile_color)
+        if grid_backend == 'image':
+            # one image instead of a canvas item per tile
+            from imagegrid import ImageGrid
+            grid_class = ImageGrid
+        else:
+            grid_class = CalendarGrid
+        self._cal_grid = grid_class(self._cont_calendar, tile_bg=calgrid_bg_tile_color)
         self._cal_grid.create_grid_year(year)
         self._cal_grid.pack(padx=20, pady=20)
 
         # 2
-        # TODO summary charts
+        # summary charts, created once the year is loaded
+        self._cont_summary = Frame(grid_container)
+        self._cont_summary.grid(row=2, column=1, columnspan=20, padx=20)
+        self._summary_chart = None
+        self._summary_year = year
 
         # 3
         # buttons
         self._date_lbl = Label(grid_container, text="Date: ")
         self._date_lbl.grid(row=3, column=1, sticky="w", pady=10)
 
+        # search over all years, matching dates are outlined
+        self._search_entry = Entry(grid_container)
+        self._search_entry.grid(row=3, column=17, columnspan=2, sticky="e")
+        self._search_btn = Button(grid_container, text="Search")
+        self._search_btn.grid(row=3, column=19, sticky="e")
+
         # 4
         # dropdown for default sport
         self._workout_choice = StringVar(grid_container)
@@ -186,9 +340,8 @@ class Gui:
         self._add_btn = Button(grid_container, text="Add")
         self._add_btn.grid(row=4, column=18, sticky="e")
 
-        # TODO sync button
-        # sync_btn = Button(grid_container, text="Sync")
-        # sync_btn.grid(row=4, column=1, sticky="w")
+        self._sync_btn = Button(grid_container, text="Sync")
+        self._sync_btn.grid(row=4, column=1, sticky="w")
 
         self._save_btn = Button(grid_container, text="Save")
         self._save_btn.grid(row=4, column=19, sticky="e")
@@ -209,7 +362,21 @@ class Gui:
                                          {'label': 'Description'}))
         self._table.pack(fill='both', expand=True)
 
+        # route preview of imported activities
+        self._route_image = None
+        self._route_lbl = Label(grid_container)
+        self._route_lbl.grid(row=5, column=21, sticky='n', pady=10)
+        self._route_lbl.grid_remove()
+
         # 6
         # bottom
         self._remove_btn = Button(grid_container, text="Remove")
         self._remove_btn.grid(row=6, column=20, sticky='nsew', pady=10)
+
+        self._years_btn = Button(grid_container, text="Years")
+        self._years_btn.grid(row=6, column=1, sticky='w', pady=10)
+
+    def _close_years(self):
+        self._years_window.destroy()
+        self._years_window = None
+        self._years_grid = None
@@ -0,0 +1,195 @@
+"""
+Headless year heatmap rendering to PNG or SVG, without Tk.
+
+    python heatmap.py --out heatmaps --format png athletes/alice athletes/bob
+
+renders every activities_<year>.csv found in the athlete directories,
+one process pool job per athlete and year.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import argparse
+import os
+import struct
+import zlib
+from color_util import hex_to_rgb, rgb_to_hex
+from journal import Journal
+from storage import CsvStorage
+import yearlayout
+
+POS_0 = 1
+STYLE = {'bg': '#d9d9d9', 'outline': '#d0d0d0', 'separator': '#000000'}
+
+
+def year_colors(store, ramp):
+    """
+    returns {date: hex color} for days with activities
+    """
+    days, totals = store.daily_minutes()
+    return dict(zip(map(date.fromordinal, days), ramp.colors(totals)))
+
+
+def tile_boxes(year, tile_size):
+    """
+    yields (date, x0, y0, x1, y1) of each tile, same geometry as CalendarGrid
+    """
+    layout = yearlayout.year_layout(year)
+    first = date(year, 1, 1).toordinal()
+    for i, (col, row) in enumerate(layout.tiles):
+        yield (date.fromordinal(first + i),
+               POS_0 + tile_size * col, POS_0 + tile_size * row,
+               POS_0 + tile_size * (col + 1), POS_0 + tile_size * (row + 1))
+
+
+def separator_lines(year, tile_size):
+    layout = yearlayout.year_layout(year)
+    return [[POS_0 + tile_size * p for p in points] for points in layout.separators]
+
+
+def canvas_size(tile_size):
+    return 54 * tile_size + 2, 7 * tile_size + 2
+
+
+def fill_box(pixels, width, x0, y0, x1, y1, rgb):
+    """
+    fills pixels inside the box outline with rgb bytes
+    """
+    row = rgb * (x1 - x0 - 1)
+    for y in range(y0 + 1, y1):
+        start = (y * width + x0 + 1) * 3
+        pixels[start:start + len(row)] = row
+
+
+def rasterize(year, colors, tile_bg, tile_size=22, style=STYLE):
+    """
+    returns (width, height, rgb bytearray) of the year grid
+    """
+    width, height = canvas_size(tile_size)
+    pixels = bytearray(bytes(hex_to_rgb(style['bg'])) * (width * height))
+
+    def hline(x0, x1, y, rgb):
+        start = (y * width + x0) * 3
+        pixels[start:start + (x1 - x0 + 1) * 3] = rgb * (x1 - x0 + 1)
+
+    def vline(x, y0, y1, rgb):
+        for y in range(y0, y1 + 1):
+            start = (y * width + x) * 3
+            pixels[start:start + 3] = rgb
+
+    outline = bytes(hex_to_rgb(style['outline']))
+    for day, x0, y0, x1, y1 in tile_boxes(year, tile_size):
+        fill = bytes(hex_to_rgb(colors.get(day, tile_bg)))
+        fill_box(pixels, width, x0, y0, x1, y1, fill)
+        hline(x0, x1, y0, outline)
+        hline(x0, x1, y1, outline)
+        vline(x0, y0, y1, outline)
+        vline(x1, y0, y1, outline)
+
+    separator = bytes(hex_to_rgb(style['separator']))
+    for points in separator_lines(year, tile_size):
+        xy = list(zip(points[::2], points[1::2]))
+        for (xa, ya), (xb, yb) in zip(xy, xy[1:]):
+            # month separators are horizontal or vertical
+            if ya == yb:
+                hline(min(xa, xb), max(xa, xb), min(ya, height - 1), separator)
+            else:
+                vline(min(xa, width - 1), min(ya, yb), min(max(ya, yb), height - 1),
+                      separator)
+    return width, height, pixels
+
+
+def ppm(width, height, pixels):
+    """
+    returns binary PPM image data, Tk PhotoImage reads it without conversion
+    """
+    return b'P6 %d %d 255\n' % (width, height) + pixels
+
+
+def write_png(png_file, width, height, pixels):
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data +
+                struct.pack('>I', zlib.crc32(tag + data)))
+
+    stride = width * 3
+    # filter type 0 in front of every scanline
+    raw = b''.join(b'\x00' + bytes(pixels[y * stride:(y + 1) * stride])
+                   for y in range(height))
+    png_file.write(b'\x89PNG\r\n\x1a\n' +
+                   chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+                   chunk(b'IDAT', zlib.compress(raw, 9)) +
+                   chunk(b'IEND', b''))
+
+
+def svg(year, colors, tile_bg, tile_size=22, style=STYLE):
+    width, height = canvas_size(tile_size)
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" '
+             'shape-rendering="crispEdges">'.format(width, height),
+             '<rect width="100%" height="100%" fill="{}"/>'.format(style['bg'])]
+    for day, x0, y0, x1, y1 in tile_boxes(year, tile_size):
+        parts.append('<rect x="{}" y="{}" width="{}" height="{}" fill="{}" stroke="{}">'
+                     '<title>{}</title></rect>'.format(x0, y0, x1 - x0, y1 - y0,
+                                                       colors.get(day, tile_bg),
+                                                       style['outline'], day))
+    for points in separator_lines(year, tile_size):
+        parts.append('<polyline points="{}" fill="none" stroke="{}"/>'.format(
+            ' '.join(map(str, points)), style['separator']))
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def render_year(csv_filename, year, out_filename, ramp, tile_size=22):
+    """
+    renders activity file of year to out_filename, format by extension
+    """
+    colors = year_colors(Journal(csv_filename).load(), ramp)
+    tile_bg = rgb_to_hex(ramp.min_rgb)
+    if out_filename.endswith('.svg'):
+        with open(out_filename, 'w') as svg_file:
+            svg_file.write(svg(year, colors, tile_bg, tile_size))
+    else:
+        with open(out_filename, 'wb') as png_file:
+            write_png(png_file, *rasterize(year, colors, tile_bg, tile_size))
+    return out_filename
+
+
+def render_batch(jobs, ramp, tile_size=22, workers=None):
+    """
+    renders (csv_filename, year, out_filename) jobs in a process pool,
+    returns list of written files
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_year, csv_filename, year, out_filename,
+                               ramp, tile_size)
+                   for csv_filename, year, out_filename in jobs]
+        return [future.result() for future in futures]
+
+
+def find_jobs(athlete_dirs, csv_prefix, out_dir, fmt):
+    # years kept only in their journal have no csv file yet
+    for athlete_dir in athlete_dirs:
+        athlete = os.path.basename(os.path.normpath(athlete_dir))
+        storage = CsvStorage(os.path.join(athlete_dir, csv_prefix))
+        for year in storage.years():
+            out = os.path.join(out_dir, '{}_{}.{}'.format(athlete, year, fmt))
+            yield storage.filename(year), year, out
+
+
+def main(argv=None):
+    from config import Config
+    parser = argparse.ArgumentParser(description='Render year heatmaps without a display')
+    parser.add_argument('athlete_dirs', nargs='+')
+    parser.add_argument('--out', default='.')
+    parser.add_argument('--format', choices=('png', 'svg'), default='png')
+    parser.add_argument('--tile-size', type=int, default=22)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    cfg = Config()
+    os.makedirs(args.out, exist_ok=True)
+    jobs = list(find_jobs(args.athlete_dirs, cfg.csv_prefix, args.out, args.format))
+    for out_filename in render_batch(jobs, cfg.color_ramp, args.tile_size, args.workers):
+        print(out_filename)
+
+
+if __name__ == "__main__":
+    main()
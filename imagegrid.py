@@ -0,0 +1,163 @@
+from tkinter import Canvas, Frame, PhotoImage
+from datetime import date
+from color_util import hex_to_rgb
+import heatmap
+import metrics
+from tiletext import TileTextMixin
+import yearlayout
+
+
+class ImageGrid(TileTextMixin, Frame):
+    """
+    CalendarGrid drawn as one PhotoImage from an rgb buffer.
+    Tiles are not canvas items, a tile id is the day of year index and
+    mouse positions are mapped to dates with the grid geometry.
+    The canvas holds the image, the selection outline and the hover text.
+    """
+    POS_0 = heatmap.POS_0
+
+    def __init__(self, parent=None, tile_size=22,
+                 bg='#d9d9d9', tile_bg='#f2f2f2', outline='#d0d0d0', separator='black',):
+        Frame.__init__(self, parent)
+        self._width, self._height = heatmap.canvas_size(tile_size)
+        self._calgrid = Canvas(self, bg=bg, bd=0, highlightthickness=0,
+                               width=self._width, height=self._height)
+        self._style = {'bg': bg, 'outline': outline,
+                       'separator': '#000000' if separator == 'black' else separator}
+        self._tbg = tile_bg
+        self._tsize = tile_size
+        self._image = PhotoImage(width=self._width, height=self._height)
+        self._calgrid.create_image(0, 0, image=self._image, anchor='nw')
+        self._year = None
+        self._first = None
+        self._layout = None
+        self._pixels = None
+        # empty year grids by layout, copied when year changes
+        self._blank = {}
+        self._selected = None
+        self._init_tile_text()
+        self._over = None
+        # outline rectangles of highlighted tiles, reused between highlights
+        self._highlights = []
+        self._highlighted = 0
+
+    def pack(self, **options):
+        super().pack(options)
+        self._calgrid.pack()
+
+    @metrics.timed('imagegrid.create_grid_year')
+    def create_grid_year(self, year):
+        self.selected(None)
+        self.remove_text()
+        self.highlight(())
+        self._year = year
+        self._first = date(year, 1, 1).toordinal()
+        self._layout = yearlayout.year_layout(year)
+        blank = self._blank.get(self._layout)
+        if blank is None:
+            blank = self._blank[self._layout] = heatmap.rasterize(
+                year, {}, self._tbg, self._tsize, self._style)[2]
+        self._pixels = bytearray(blank)
+        self._blit()
+
+    def bind_tiles_callback(self, callback=None, event_trigger='<Button-1>'):
+        if event_trigger == '<Enter>':
+            # no items to enter, called when the pointer moves to another tile
+            def _motion(event):
+                tile_id = self._tile_at(event.x, event.y)
+                if tile_id != self._over:
+                    self._over = tile_id
+                    if callback and tile_id is not None:
+                        callback(self.date(tile_id), tile_id)
+            self._calgrid.bind('<Motion>', _motion)
+            return
+
+        def _callback(event):
+            tile_id = self._tile_at(event.x, event.y)
+            if callback and tile_id is not None:
+                callback(self.date(tile_id), tile_id)
+        self._calgrid.bind(event_trigger, _callback)
+
+    def tile(self, date):
+        index = date.toordinal() - self._first
+        return index if 0 <= index < self._layout.days() else None
+
+    def date(self, tile):
+        return date.fromordinal(self._first + tile)
+
+    def set_tile_color_rgb(self, date, color_hex):
+        tile = self.tile(date)
+        if tile is None:
+            return
+        self._fill(tile, color_hex)
+        x0, y0, x1, y1 = self._box(tile)
+        self._image.put(color_hex, to=(x0 + 1, y0 + 1, x1, y1))
+
+    @metrics.timed('imagegrid.set_tiles_color')
+    def set_tiles_color(self, dates_and_colors):
+        for date, color_hex in dates_and_colors:
+            tile = self.tile(date)
+            if tile is not None:
+                self._fill(tile, color_hex)
+        self._blit()
+
+    def selected(self, date):
+        tile = None if date is None or self._layout is None else self.tile(date)
+        if tile is None:
+            if self._selected:
+                self._calgrid.itemconfig(self._selected, state='hidden')
+            return
+        x0, y0, x1, y1 = self._box(tile)
+        points = (x0, y0, x1, y0, x1, y1, x0, y1, x0, y0)
+        if self._selected is None:
+            self._selected = self._calgrid.create_line(*points, fill="green", width=2)
+        else:
+            self._calgrid.coords(self._selected, *points)
+            self._calgrid.itemconfig(self._selected, state='normal')
+
+    @metrics.timed('imagegrid.highlight')
+    def highlight(self, dates, outline='#0050ff'):
+        """
+        outlines tiles of dates, replaces the previous highlight
+        """
+        tiles = [] if self._layout is None else \
+            [t for t in map(self.tile, dates) if t is not None]
+        while len(self._highlights) < len(tiles):
+            self._highlights.append(self._calgrid.create_rectangle(
+                0, 0, 0, 0, outline=outline, width=2, state='disabled'))
+        for item, tile in zip(self._highlights, tiles):
+            self._calgrid.coords(item, *self._box(tile))
+            self._calgrid.itemconfig(item, outline=outline, state='disabled')
+        for item in self._highlights[len(tiles):self._highlighted]:
+            self._calgrid.itemconfig(item, state='hidden')
+        self._highlighted = len(tiles)
+
+    def remove_text(self):
+        super().remove_text()
+        self._over = None
+
+    # private
+    def _tile_origin(self, tile_id):
+        return self._box(tile_id)[:2]
+
+    def _box(self, tile):
+        col, row = self._layout.tiles[tile]
+        size = self._tsize
+        return (ImageGrid.POS_0 + size * col, ImageGrid.POS_0 + size * row,
+                ImageGrid.POS_0 + size * (col + 1), ImageGrid.POS_0 + size * (row + 1))
+
+    def _tile_at(self, x, y):
+        if self._year is None or x < ImageGrid.POS_0 or y < ImageGrid.POS_0:
+            return None
+        col = (x - ImageGrid.POS_0) // self._tsize
+        row = (y - ImageGrid.POS_0) // self._tsize
+        day = yearlayout.day_at(self._year, col, row)
+        return None if day is None else day.toordinal() - self._first
+
+    def _fill(self, tile, color_hex):
+        heatmap.fill_box(self._pixels, self._width, *self._box(tile),
+                         bytes(hex_to_rgb(color_hex)))
+
+    def _blit(self):
+        self._image.configure(data=heatmap.ppm(self._width, self._height, self._pixels),
+                              format='PPM')
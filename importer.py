@@ -0,0 +1,284 @@
+"""
+Backfill of recorded workouts from GPX and TCX files.
+
+    python importer.py ~/tracks ~/garmin/*.tcx --sport custom
+
+Files are parsed in a process pool with iterparse, finished xml elements
+are dropped and only the coordinates are kept, as int arrays. Imported
+activities are added to the days they started on with one save per year,
+workouts of a day or longer are reported instead. A recording already
+imported on its day, or twice in one run, is skipped: its start time and
+duration (the track id ending the description) are compared, not file
+names. Tracks are written to the track store (see tracks.py) as files
+are parsed, only the activity rows are kept until the save.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import argparse
+import glob
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from model import format_number
+from timedelta_util import minutes_to_hh_mm
+from tracks import SCALE, Track, description_track_id, track_id
+
+EXTENSIONS = ('.gpx', '.tcx')
+SPORTS = {'running': 'run', 'run': 'run', 'biking': 'bike', 'cycling': 'bike',
+          'ride': 'bike', 'virtualride': 'zwift'}
+EARTH_RADIUS_KM = 6371.0088
+MAX_MINUTES = 23 * 60 + 59
+_TIME = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(\.\d+)?'
+                   r'(Z|[+-]\d\d:?\d\d)?$')
+
+
+class Workout:
+    """
+    Summary of one recorded file, start is a local datetime,
+    track is encoded Track data or None without positions
+    """
+
+    def __init__(self, filename, start, seconds, distance_km, sport, track=None):
+        self.filename = filename
+        self.start = start
+        self.seconds = seconds
+        self.distance_km = distance_km
+        self.sport = sport
+        self.track = track
+
+
+def encode_track(lats, lons):
+    # simplified in the pool worker, the main process only writes
+    return Track.from_points(lats, lons).encode() if len(lats) > 1 else None
+
+
+def parse_time(text):
+    """
+    returns aware datetime of an xml schema time, without zone it is utc
+    """
+    match = _TIME.match(text.strip())
+    if not match:
+        raise ValueError('invalid time {!r}'.format(text))
+    fields = [int(match.group(i)) for i in range(1, 7)]
+    micros = int(round(float(match.group(7)) * 1e6)) if match.group(7) else 0
+    zone = match.group(8)
+    if not zone or zone == 'Z':
+        tz = timezone.utc
+    else:
+        sign = -1 if zone[0] == '-' else 1
+        digits = zone[1:].replace(':', '')
+        tz = timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+    return datetime(*fields, microsecond=micros, tzinfo=tz)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _iter_ends(filename):
+    """
+    yields (local tag, element, parent) at element ends, children of
+    parent are dropped after the caller is done with them
+    """
+    stack = []
+    for event, elem in ET.iterparse(filename, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        parent = stack[-1] if stack else None
+        yield _local(elem.tag), elem, parent
+
+
+def parse_gpx(filename):
+    first = last = None
+    # file creation time, the start only without timed points
+    created = None
+    distance = 0.0
+    previous = None
+    sport = ''
+    lats, lons = array('l'), array('l')
+    for tag, elem, parent in _iter_ends(filename):
+        if tag == 'type' and parent is not None and _local(parent.tag) == 'trk':
+            sport = (elem.text or '').strip()
+        elif tag == 'trkpt':
+            point = float(elem.get('lat')), float(elem.get('lon'))
+            if previous:
+                distance += haversine_km(previous[0], previous[1], *point)
+            previous = point
+            lats.append(int(round(point[0] * SCALE)))
+            lons.append(int(round(point[1] * SCALE)))
+            for child in elem:
+                if _local(child.tag) == 'time' and child.text:
+                    moment = parse_time(child.text)
+                    first = first or moment
+                    last = moment
+            # drops finished points so memory stays flat
+            parent.clear()
+        elif tag == 'time' and parent is not None \
+                and _local(parent.tag) == 'metadata' and elem.text:
+            created = parse_time(elem.text)
+    first = first or created
+    if first is None:
+        raise ValueError('no time in {}'.format(filename))
+    seconds = (last - first).total_seconds() if last else 0
+    return Workout(filename, first.astimezone(), seconds, distance, sport,
+                   encode_track(lats, lons))
+
+
+def parse_tcx(filename):
+    start = None
+    seconds = 0.0
+    distance_m = 0.0
+    sport = ''
+    lats, lons = array('l'), array('l')
+    lat = None
+    for tag, elem, parent in _iter_ends(filename):
+        if tag == 'LatitudeDegrees':
+            lat = float(elem.text)
+        elif tag == 'LongitudeDegrees' and lat is not None:
+            lats.append(int(round(lat * SCALE)))
+            lons.append(int(round(float(elem.text) * SCALE)))
+            lat = None
+        elif tag == 'Trackpoint':
+            parent.clear()
+        elif tag == 'TotalTimeSeconds' and _local(parent.tag) == 'Lap':
+            seconds += float(elem.text)
+        elif tag == 'DistanceMeters' and _local(parent.tag) == 'Lap':
+            distance_m += float(elem.text)
+        elif tag == 'Lap':
+            if start is None and elem.get('StartTime'):
+                start = parse_time(elem.get('StartTime'))
+            elem.clear()
+        elif tag == 'Id' and start is None and _local(parent.tag) == 'Activity':
+            start = parse_time(elem.text)
+        elif tag == 'Activity':
+            sport = elem.get('Sport', '')
+    if start is None:
+        raise ValueError('no start time in {}'.format(filename))
+    return Workout(filename, start.astimezone(), seconds, distance_m / 1000, sport,
+                   encode_track(lats, lons))
+
+
+def parse_file(filename):
+    """
+    returns Workout or the error message, runs in pool workers
+    """
+    try:
+        if filename.lower().endswith('.tcx'):
+            workout = parse_tcx(filename)
+        else:
+            workout = parse_gpx(filename)
+    except (ET.ParseError, ValueError, OSError) as e:
+        return '{}: {}'.format(filename, e)
+    if round(workout.seconds / 60) > MAX_MINUTES:
+        # durations are stored as H:MM of one day
+        return '{}: longer than {}'.format(filename, minutes_to_hh_mm(MAX_MINUTES))
+    return workout
+
+
+def find_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield from sorted(glob.glob(path)) or [path]
+
+
+def activity(workout, defaults_by_sport, default_sport):
+    """
+    returns str activity fields (sport, duration, distance, intensity, description),
+    the description is the file name and the track id of the recording
+    """
+    sport = SPORTS.get(workout.sport.lower().replace(' ', ''), default_sport)
+    defaults = defaults_by_sport.get(sport, {})
+    return (sport, minutes_to_hh_mm(int(round(workout.seconds / 60))),
+            format_number(round(workout.distance_km, 2)),
+            defaults.get('intensity', ''),
+            '{} {}'.format(os.path.basename(workout.filename),
+                           track_id(workout.start, workout.seconds)))
+
+
+def merge(storage, activities_by_year):
+    """
+    adds activities {year: {day: {track id: activity}}} to their days
+    unless the day has an activity of that id, saves each year once,
+    returns number of activities added
+    """
+    added = 0
+    for year, days in sorted(activities_by_year.items()):
+        store = storage.read_year(year)
+        changed = {}
+        for day, activities in days.items():
+            existing = list(store.day(day))
+            ids = {description_track_id(a[4]) for a in existing if len(a) > 4}
+            new = [a for tid, a in sorted(activities.items()) if tid not in ids]
+            if new:
+                changed[day] = existing + new
+                added += len(new)
+        if changed:
+            storage.save_days(changed)
+    return added
+
+
+def import_files(storage, filenames, defaults_by_sport, default_sport='custom',
+                 workers=None, tracks=None):
+    """
+    returns (activities added, error messages), tracks go to tracks
+    (a TrackStore) as their files are parsed
+    """
+    by_year, errors = {}, []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(parse_file, filenames, chunksize=8):
+            if not isinstance(result, Workout):
+                errors.append(result)
+                continue
+            day = result.start.date()
+            tid = track_id(result.start, result.seconds)
+            activities = by_year.setdefault(day.year, {}).setdefault(day, {})
+            # the same recording under another name or in another folder
+            if tid in activities:
+                continue
+            activities[tid] = activity(result, defaults_by_sport, default_sport)
+            if tracks and result.track and tid not in tracks.ids(day):
+                tracks.save(day, tid, result.track)
+    return merge(storage, by_year), errors
+
+
+def main(argv=None):
+    from config import Config
+    from storage import open_storage
+    from tracks import TrackStore
+    parser = argparse.ArgumentParser(description='Import GPX/TCX workouts')
+    parser.add_argument('paths', nargs='+', help='files, globs or directories')
+    parser.add_argument('--sport', default='custom', help='sport of unknown types')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    cfg = Config()
+    storage = open_storage(cfg)
+    try:
+        added, errors = import_files(storage, list(find_files(args.paths)),
+                                     cfg.activity_defaults_by_sport, args.sport,
+                                     args.workers, TrackStore(cfg.track_path))
+    finally:
+        storage.close()
+    for error in errors:
+        print(error)
+    print('{} activities imported'.format(added))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import csv
+import io
+import os
+import threading
+import zlib
+from date_util import date_from_str
+from file_util import atomic_write
+import metrics
+from model import ActivityStore
+
+
+class Journal:
+    """
+    Append-only log of day edits kept next to a year csv file.
+    Each entry replaces all activities of one day and is written as
+    a header line followed by the day's csv rows:
+
+        !2018-05-18|<payload bytes>|<payload crc32>
+        2018-05-18|bike|2:00|55|3|
+
+    Replaying entries is idempotent. Entries after a torn or corrupt one
+    are ignored, so the journal is cut back to its valid entries before
+    the next append.
+    """
+
+    HEADER_MARK = b'!'
+    # journals of the same file share lock and compaction thread,
+    # a year can be reopened while its previous compaction still runs
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, csv_filename, max_size=64 * 1024, delimiter='|'):
+        self._csv_filename = csv_filename
+        self._filename = os.path.splitext(csv_filename)[0] + '.journal'
+        self._max_size = max_size
+        self._delimiter = delimiter
+        with Journal._shared_lock:
+            self._state = Journal._shared.setdefault(os.path.abspath(self._filename),
+                                                     {'lock': threading.Lock(),
+                                                      'compaction': None,
+                                                      'valid_size': None})
+        self._lock = self._state['lock']
+
+    @property
+    def filename(self):
+        return self._filename
+
+    def append(self, day, activities):
+        """
+        appends activities (str tuples in csv field order) replacing day
+        """
+        self.append_days({day: activities})
+
+    def append_days(self, activities_by_date):
+        """
+        appends entries of several days with a single write
+        """
+        data = b''.join(self._entry(day, activities)
+                        for day, activities in sorted(activities_by_date.items()))
+        with self._lock:
+            size = self._truncate_torn()
+            with open(self._filename, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._state['valid_size'] = size + len(data)
+
+    def entries(self):
+        """
+        yields (date, activities) entries in write order
+        """
+        with self._lock:
+            data = self._read(0)
+        return self._entries(data)
+
+    @metrics.timed('journal.load')
+    def load(self):
+        """
+        returns store with the year csv and journal entries applied
+        """
+        return self._store(*self._read_files())
+
+    def replay(self, store):
+        for day, activities in self.entries():
+            store.set_day(day, activities)
+
+    def size(self):
+        try:
+            return os.path.getsize(self._filename)
+        except OSError:
+            return 0
+
+    def needs_compaction(self):
+        return self.size() > self._max_size
+
+    def compact(self):
+        """
+        rewrites the year csv with the journal entries applied in a worker
+        thread and drops the entries it contains
+        """
+        with self._lock:
+            compaction = self._state['compaction']
+            if compaction and compaction.is_alive():
+                return compaction
+            compaction = threading.Thread(target=self._compact, name='journal-compaction')
+            self._state['compaction'] = compaction
+            compaction.start()
+        return compaction
+
+    def wait(self):
+        compaction = self._state['compaction']
+        if compaction:
+            compaction.join()
+
+    # private
+    def _compact(self):
+        # the snapshot is read from the files, not taken from a store the
+        # ui thread may be changing
+        text, data = self._read_files()
+        snapshot = self._store(text, data)
+        with atomic_write(self._csv_filename) as csv_file:
+            snapshot.write_csv(csv_file, delimiter=self._delimiter)
+        # entries appended while the csv was written are kept, they start
+        # where the valid entries of data end since appends cut torn bytes
+        with self._lock:
+            tail = self._read(self._parse(data)[1])
+            tail = tail[:self._parse(tail)[1]]
+            with atomic_write(self._filename, 'wb') as f:
+                f.write(tail)
+            self._state['valid_size'] = len(tail)
+
+    def _truncate_torn(self):
+        """
+        cuts the journal after its last valid entry, returns its size,
+        called under the lock
+        """
+        size = self.size()
+        if size == self._state['valid_size']:
+            return size
+        valid_size = self._parse(self._read(0))[1]
+        if valid_size < size:
+            with open(self._filename, 'r+b') as f:
+                f.truncate(valid_size)
+                f.flush()
+                os.fsync(f.fileno())
+        self._state['valid_size'] = valid_size
+        return valid_size
+
+    def _read_files(self):
+        """
+        returns (csv text, journal data), both read under the lock since a
+        compaction replaces the csv before it cuts the journal and the old
+        csv needs the whole journal
+        """
+        with self._lock:
+            try:
+                with open(self._csv_filename, 'r') as csv_file:
+                    text = csv_file.read()
+            except FileNotFoundError:
+                text = ''
+            return text, self._read(0)
+
+    def _store(self, text, data):
+        store = ActivityStore.read_csv(io.StringIO(text), delimiter=self._delimiter)
+        for day, activities in self._entries(data):
+            store.set_day(day, activities)
+        return store
+
+    def _entries(self, data):
+        for day, payload in self._parse(data)[0]:
+            rows = csv.reader(io.StringIO(payload.decode('utf-8')),
+                              delimiter=self._delimiter)
+            yield day, [row[1:] for row in rows if row]
+
+    def _entry(self, day, activities):
+        payload = io.StringIO()
+        writer = csv.writer(payload, delimiter=self._delimiter)
+        for activity in activities:
+            writer.writerow((day,) + tuple(activity))
+        payload = payload.getvalue().encode('utf-8')
+        header = '!{}{d}{}{d}{}\n'.format(day, len(payload), zlib.crc32(payload),
+                                          d=self._delimiter)
+        return header.encode('utf-8') + payload
+
+    def _read(self, offset):
+        try:
+            with open(self._filename, 'rb') as f:
+                f.seek(offset)
+                return f.read()
+        except FileNotFoundError:
+            return b''
+
+    def _parse(self, data):
+        """
+        returns ([(date, payload)], end offset of the last valid entry)
+        """
+        entries = []
+        pos = 0
+        delimiter = self._delimiter.encode('utf-8')
+        while pos < len(data):
+            end = data.find(b'\n', pos)
+            if end < 0 or not data.startswith(self.HEADER_MARK, pos):
+                break
+            try:
+                day, size, crc = data[pos + 1:end].split(delimiter)
+                day, size, crc = date_from_str(day.decode('utf-8')), int(size), int(crc)
+            except ValueError:
+                break
+            payload = data[end + 1:end + 1 + size]
+            if len(payload) != size or zlib.crc32(payload) != crc:
+                break
+            entries.append((day, payload))
+            pos = end + 1 + size
+        return entries, pos
@@ -0,0 +1,144 @@
+"""
+Timers and counters for hot paths, off unless GRIDS_METRICS is set:
+
+    GRIDS_METRICS=1 python sportsapp.py
+    GRIDS_METRICS=overlay python sportsapp.py      # live p50/p99 over the window
+    GRIDS_METRICS=1 GRIDS_TRACE=trace.json python sportsapp.py
+
+The report is printed on exit. With GRIDS_TRACE, spans are also written
+in the Chrome trace event format, which chrome://tracing, Perfetto and
+speedscope show as a flame graph. When disabled, timed() returns the
+function itself and span() an empty context manager.
+"""
+from collections import deque
+from contextlib import contextmanager
+import functools
+import json
+import os
+import threading
+import time
+
+enabled = os.environ.get('GRIDS_METRICS', '') not in ('', '0')
+overlay = os.environ.get('GRIDS_METRICS', '') == 'overlay'
+trace_filename = os.environ.get('GRIDS_TRACE') or None
+
+# durations kept per name for percentiles and spans kept for the trace
+WINDOW = 1000
+MAX_EVENTS = 200000
+
+_durations = {}
+_counters = {}
+_events = deque(maxlen=MAX_EVENTS)
+_start = time.perf_counter()
+_lock = threading.Lock()
+
+
+def record(name, started, duration):
+    """
+    adds a span of duration seconds that started at perf_counter() started
+    """
+    samples = _durations.get(name)
+    if samples is None:
+        with _lock:
+            samples = _durations.setdefault(name, deque(maxlen=WINDOW))
+    samples.append(duration)
+    if trace_filename:
+        _events.append((name, started, duration, threading.get_ident()))
+
+
+def count(name, n=1):
+    if enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def timed(name):
+    """
+    decorator timing every call of the function as name
+    """
+    def decorate(func):
+        if not enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, started, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def _span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, started, time.perf_counter() - started)
+
+
+@contextmanager
+def _no_span():
+    yield
+
+
+def span(name):
+    """
+    context manager timing its block as name
+    """
+    return _span(name) if enabled else _no_span()
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def stats():
+    """
+    returns {name: (calls in window, p50 ms, p99 ms)} and {name: count}
+    """
+    with _lock:
+        names = list(_durations.items())
+        counters = dict(_counters)
+    result = {}
+    for name, samples in names:
+        values = sorted(samples)
+        if values:
+            result[name] = (len(values), percentile(values, 0.5) * 1000,
+                            percentile(values, 0.99) * 1000)
+    return result, counters
+
+
+def report():
+    """
+    returns stats as text lines, slowest p99 first
+    """
+    timers, counters = stats()
+    lines = ['{:<32} {:>5} p50 {:>7.2f} p99 {:>7.2f} ms'.format(name, n, p50, p99)
+             for name, (n, p50, p99) in sorted(timers.items(),
+                                               key=lambda item: -item[1][2])]
+    lines.extend('{:<32} {:>5}'.format(name, n) for name, n in sorted(counters.items()))
+    return '\n'.join(lines)
+
+
+def export_trace(filename):
+    """
+    writes recorded spans as complete ('X') trace events
+    """
+    pid = os.getpid()
+    events = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+               'ts': round((started - _start) * 1e6, 1), 'dur': round(duration * 1e6, 1)}
+              for name, started, duration, tid in list(_events)]
+    with open(filename, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return len(events)
+
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _counters.clear()
+        _events.clear()
@@ -1,6 +1,341 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+import csv
+import sys
+from date_util import ordinal_from_str
+from timedelta_util import minutes_from_hh_mm, minutes_to_hh_mm, parse_hh_mm
 
-# selected day (from CalendarGrid)
-# activities_by_date =
-# {'01-01-2018': [ ['bike', '01:24', '3', '45', 'bla'],
-#                  ['run', '00:24', '3', '5', 'bla'] ],
-#  '02-02-2018': [ ...
+# row layout in activity csv files:
+# date|sport|duration|distance|intensity|description
+# ex. 2018-05-18|bike|2:00|55|3|
+ACTIVITY_FIELDS = ('sport', 'duration', 'distance', 'intensity', 'description')
+INTENSITY_MAX = 32767
+
+
+def parse_distance(value):
+    try:
+        distance = float(value)
+    except ValueError:
+        return 0.0
+    # nan and inf are not distances
+    return distance if 0 <= distance < float('inf') else 0.0
+
+
+def parse_intensity(value):
+    try:
+        return max(0, min(INTENSITY_MAX, int(value)))
+    except ValueError:
+        return 0
+
+
+def parse_fields(ordinal, fields):
+    """
+    returns typed (ordinal, sport, minutes, distance, intensity, description)
+    of str fields in csv field order
+    """
+    fields = list(fields[:len(ACTIVITY_FIELDS)])
+    fields.extend([''] * (len(ACTIVITY_FIELDS) - len(fields)))
+    sport, duration, distance, intensity, description = fields
+    return (ordinal, sport, minutes_from_hh_mm(duration), parse_distance(distance),
+            parse_intensity(intensity), description)
+
+
+def invalid_fields(fields):
+    """
+    returns names of str fields in csv field order that parse_fields
+    would not keep as typed, empty fields are valid
+    """
+    invalid = []
+    for name, value in zip(ACTIVITY_FIELDS, fields):
+        value = value.strip()
+        if not value:
+            continue
+        if name == 'duration' and parse_hh_mm(value) is None:
+            invalid.append(name)
+        elif name == 'distance' and (_number(value, float) is None or
+                                     parse_distance(value) != float(value)):
+            invalid.append(name)
+        elif name == 'intensity' and (_number(value, int) is None or
+                                      parse_intensity(value) != int(value)):
+            invalid.append(name)
+    return invalid
+
+
+def _number(value, kind):
+    try:
+        return kind(value)
+    except ValueError:
+        return None
+
+
+def format_number(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class ActivityStore:
+    """
+    Activities of one or more years held in typed columns.
+    Rows are kept sorted by day so one day is a contiguous slice.
+    Rows whose text does not convert (from files older than the typed
+    columns) keep their raw fields and are written back unchanged.
+    """
+
+    def __init__(self):
+        self._days = array('l')
+        self._sports = array('H')
+        self._minutes = array('l')
+        self._distance = array('d')
+        self._intensity = array('h')
+        # description of row i is self._desc[desc_start[i]:desc_end[i]]
+        self._desc_start = array('L')
+        self._desc_end = array('L')
+        self._desc = ''
+        self._desc_live = 0
+        # raw fields of row i are self._raw_fields[_raw[i]], 0 for typed rows
+        self._raw = array('L')
+        self._raw_fields = [None]
+        # interned sport names, code is index in _sport_names
+        self._sport_names = []
+        self._sport_codes = {}
+
+    @classmethod
+    def read_csv(cls, csv_file, delimiter='|'):
+        store = cls()
+        rows = []
+        for row in csv.reader(csv_file, delimiter=delimiter):
+            if row:
+                rows.append((ordinal_from_str(row[0]), row[1:]))
+        # files written by the app are already sorted, sort is stable
+        rows.sort(key=lambda r: r[0])
+        store._append_rows(rows)
+        return store
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        creates store from typed (ordinal, sport, minutes, distance,
+        intensity, description) tuples sorted by ordinal
+        """
+        store = cls()
+        store._extend(store._typed_columns(values))
+        return store
+
+    def values(self):
+        """
+        yields typed rows as accepted by from_values
+        """
+        for i in range(len(self._days)):
+            yield (self._days[i], self._sport_names[self._sports[i]], self._minutes[i],
+                   self._distance[i], self._intensity[i],
+                   self._desc[self._desc_start[i]:self._desc_end[i]])
+
+    def write_csv(self, csv_file, delimiter='|'):
+        writer = csv.writer(csv_file, delimiter=delimiter)
+        to_date = date.fromordinal
+        last_ordinal, last_date = None, None
+        for i in range(len(self._days)):
+            if self._days[i] != last_ordinal:
+                last_ordinal = self._days[i]
+                last_date = to_date(last_ordinal)
+            writer.writerow((last_date,) + self._row(i))
+
+    def copy(self):
+        store = ActivityStore()
+        for column, values in zip(store._column_arrays(), self._column_arrays()):
+            column.extend(values)
+        store._desc = self._desc
+        store._desc_live = self._desc_live
+        store._raw_fields = list(self._raw_fields)
+        store._sport_names = list(self._sport_names)
+        store._sport_codes = dict(self._sport_codes)
+        return store
+
+    def __len__(self):
+        return len(self._days)
+
+    def nbytes(self):
+        return (sum(c.itemsize * len(c) for c in self._column_arrays()) +
+                sys.getsizeof(self._desc) +
+                sum(sys.getsizeof(fields) for fields in self._raw_fields) +
+                sum(sys.getsizeof(name) for name in self._sport_names))
+
+    def raw_dates(self):
+        """
+        returns sorted dates of rows kept as raw text, typed values of
+        these rows are 0
+        """
+        return sorted({date.fromordinal(d)
+                       for d, raw in zip(self._days, self._raw) if raw})
+
+    def dates(self):
+        """
+        returns sorted list of distinct dates having activities
+        """
+        days = self._days
+        return [date.fromordinal(d) for i, d in enumerate(days)
+                if i == 0 or days[i - 1] != d]
+
+    def day_slice(self, day):
+        """
+        returns (start, stop) row indices of activities at date
+        """
+        ordinal = day.toordinal()
+        return (bisect_left(self._days, ordinal),
+                bisect_right(self._days, ordinal))
+
+    def day(self, day):
+        """
+        returns activities at date as list of str tuples in csv field order
+        """
+        start, stop = self.day_slice(day)
+        return [self._row(i) for i in range(start, stop)]
+
+    def day_values(self, day):
+        """
+        returns activities at date as typed (sport, minutes, distance, intensity)
+        """
+        start, stop = self.day_slice(day)
+        return [(self._sport_names[self._sports[i]], self._minutes[i],
+                 self._distance[i], self._intensity[i]) for i in range(start, stop)]
+
+    def day_minutes(self, day):
+        start, stop = self.day_slice(day)
+        return sum(self._minutes[start:stop])
+
+    def daily_minutes(self):
+        """
+        returns (day ordinals, minute totals) arrays, one entry per day
+        with activities
+        """
+        days, totals = array('l'), array('l')
+        last = None
+        for ordinal, minutes in zip(self._days, self._minutes):
+            if ordinal == last:
+                totals[-1] += minutes
+            else:
+                days.append(ordinal)
+                totals.append(minutes)
+                last = ordinal
+        return days, totals
+
+    def set_day(self, day, activities):
+        """
+        replaces all activities at date, activities are str sequences
+        in csv field order
+        """
+        start, stop = self.day_slice(day)
+        ordinal = day.toordinal()
+        self._desc_live -= sum(self._desc_end[i] - self._desc_start[i]
+                               for i in range(start, stop))
+        new = self._columns([(ordinal, a) for a in activities])
+        for column, values in zip(self._column_arrays(), new):
+            column[start:stop] = values
+        if len(self._desc) > 4096 and len(self._desc) > 2 * self._desc_live:
+            self._compact_desc()
+
+    # columns for whole-store scans, treat as read-only
+    @property
+    def days(self):
+        return self._days
+
+    @property
+    def sports(self):
+        return self._sports
+
+    @property
+    def sport_names(self):
+        return tuple(self._sport_names)
+
+    @property
+    def minutes(self):
+        return self._minutes
+
+    @property
+    def distance(self):
+        return self._distance
+
+    @property
+    def intensity(self):
+        return self._intensity
+
+    # private
+    def _column_arrays(self):
+        return (self._days, self._sports, self._minutes, self._distance,
+                self._intensity, self._desc_start, self._desc_end, self._raw)
+
+    def _sport_code(self, sport):
+        code = self._sport_codes.get(sport)
+        if code is None:
+            code = len(self._sport_names)
+            self._sport_names.append(sport)
+            self._sport_codes[sport] = code
+        return code
+
+    def _columns(self, rows):
+        """
+        converts (ordinal, [str fields]) rows into new column arrays,
+        appending descriptions to the description buffer
+        """
+        return self._typed_columns(parse_fields(ordinal, fields) + (self._raw_id(fields),)
+                                   for ordinal, fields in rows)
+
+    def _raw_id(self, fields):
+        if len(fields) <= len(ACTIVITY_FIELDS) and not invalid_fields(fields):
+            return 0
+        self._raw_fields.append(tuple(fields))
+        return len(self._raw_fields) - 1
+
+    def _typed_columns(self, values):
+        """
+        same as _columns for typed values as in parse_fields, optionally
+        followed by a raw fields id
+        """
+        columns = tuple(array(c.typecode) for c in self._column_arrays())
+        days, sports, minutes, distance, intensity, desc_start, desc_end, raw = columns
+        descriptions = []
+        offset = len(self._desc)
+        for value in values:
+            ordinal, sport, duration, dist, intens, desc = value[:6]
+            raw.append(value[6] if len(value) > 6 else 0)
+            days.append(ordinal)
+            sports.append(self._sport_code(sport))
+            minutes.append(duration)
+            distance.append(dist)
+            intensity.append(intens)
+            desc_start.append(offset)
+            offset += len(desc)
+            desc_end.append(offset)
+            descriptions.append(desc)
+        text = ''.join(descriptions)
+        self._desc += text
+        self._desc_live += len(text)
+        return columns
+
+    def _append_rows(self, rows):
+        self._extend(self._columns(rows))
+
+    def _extend(self, columns):
+        for column, values in zip(self._column_arrays(), columns):
+            column.extend(values)
+
+    def _compact_desc(self):
+        parts = []
+        offset = 0
+        for i in range(len(self._days)):
+            text = self._desc[self._desc_start[i]:self._desc_end[i]]
+            parts.append(text)
+            self._desc_start[i] = offset
+            offset += len(text)
+            self._desc_end[i] = offset
+        self._desc = ''.join(parts)
+        self._desc_live = offset
+
+    def _row(self, i):
+        if self._raw[i]:
+            return self._raw_fields[self._raw[i]]
+        return (self._sport_names[self._sports[i]],
+                minutes_to_hh_mm(self._minutes[i]),
+                format_number(self._distance[i]),
+                str(self._intensity[i]),
+                self._desc[self._desc_start[i]:self._desc_end[i]])
@@ -0,0 +1,168 @@
+from tkinter import Canvas, Frame
+from array import array
+from bisect import bisect_right
+from datetime import date
+import metrics
+import yearlayout
+
+
+class MultiYearGrid(Frame):
+    """
+    Years stacked below each other, one CalendarGrid-like band per year.
+    Tiles of a year are created in one block so date <-> tile is computed
+    from the block's first item id. Each colored tile carries the tag of
+    its color bucket, recoloring is one itemconfig per bucket.
+    """
+    MAX_YEARS = 20
+    POS_0 = 1
+
+    def __init__(self, parent=None, palette=(), tile_size=12,
+                 bg='#d9d9d9', tile_bg='#f2f2f2', outline='#d0d0d0', text='#404040'):
+        Frame.__init__(self, parent)
+        self._tsize = tile_size
+        self._label_width = 4 * tile_size
+        self._band = 7 * tile_size + tile_size // 2
+        self._tbg = tile_bg
+        self._toutline = outline
+        self._calgrid = Canvas(self, bg=bg, bd=0, highlightthickness=0,
+                               width=self._label_width + 54 * tile_size + 2,
+                               height=self._band * 5)
+        self._calgrid.pack()
+        self._palette = list(palette)
+        self._tags = ['bucket{}'.format(i) for i in range(len(self._palette))]
+        self._text_color = text
+        # first item id of each year block, blocks are reused for other years
+        self._blocks = []
+        self._block_layouts = []
+        self._labels = []
+        self._first_year = None
+        self._year_count = 0
+        self._first_ordinals = []
+        # bucket of each tile by block * DAYS_MAX + day of year, -1 for none
+        self._buckets = array('b')
+
+    def show_years(self, first_year, last_year):
+        """
+        lays out years first_year..last_year, all tiles uncolored
+        """
+        count = min(last_year - first_year + 1, MultiYearGrid.MAX_YEARS)
+        while len(self._blocks) < count:
+            self._create_block()
+        for k in range(len(self._blocks)):
+            if k < count:
+                self._show_block(k, first_year + k)
+            elif self._block_layouts[k] is not None:
+                self._calgrid.itemconfig('block{}'.format(k), state='hidden')
+                self._calgrid.itemconfig(self._labels[k], text='')
+                self._block_layouts[k] = None
+        self._first_year = first_year
+        self._year_count = count
+        self._first_ordinals = [date(first_year + k, 1, 1).toordinal()
+                                for k in range(count)]
+        self._calgrid.config(height=self._band * count + 2)
+        for tag in self._tags:
+            self._calgrid.dtag('mtile', tag)
+        self._calgrid.itemconfig('mtile', fill=self._tbg)
+        self._buckets = array('b', [-1]) * (len(self._blocks) * yearlayout.DAYS_MAX)
+
+    @metrics.timed('multigrid.set_buckets')
+    def set_buckets(self, dates_and_buckets):
+        """
+        moves tiles of dates to color buckets (palette indices),
+        bucket None shows the tile uncolored
+        """
+        canvas, buckets, tags = self._calgrid, self._buckets, self._tags
+        changed = set()
+        for day, bucket in dates_and_buckets:
+            index = self._index(day)
+            if index is None:
+                continue
+            old = buckets[index]
+            new = -1 if bucket is None else bucket
+            if old == new:
+                continue
+            tile = self._tile_at(index)
+            if old >= 0:
+                canvas.dtag(tile, tags[old])
+            if new >= 0:
+                canvas.addtag_withtag(tags[new], tile)
+                changed.add(new)
+            else:
+                canvas.itemconfig(tile, fill=self._tbg)
+            buckets[index] = new
+        for bucket in changed:
+            canvas.itemconfig(tags[bucket], fill=self._palette[bucket])
+
+    def set_palette(self, palette):
+        """
+        recolors all tiles, one itemconfig per bucket
+        """
+        self._palette = list(palette)
+        while len(self._tags) < len(self._palette):
+            self._tags.append('bucket{}'.format(len(self._tags)))
+        for tag, color in zip(self._tags, self._palette):
+            self._calgrid.itemconfig(tag, fill=color)
+
+    def tile(self, day):
+        index = self._index(day)
+        return None if index is None else self._tile_at(index)
+
+    def date(self, tile):
+        k = bisect_right(self._blocks, tile) - 1
+        if k < 0 or k >= self._year_count:
+            return None
+        day = tile - self._blocks[k]
+        if day >= self._block_layouts[k].days():
+            return None
+        return date.fromordinal(self._first_ordinals[k] + day)
+
+    def bind_tiles_callback(self, callback=None, event_trigger='<Button-1>'):
+        def _callback(event):
+            tile_id = event.widget.find_withtag("current")[0]
+            day = self.date(tile_id)
+            if callback and day:
+                callback(day, tile_id)
+        self._calgrid.tag_bind("mtile", event_trigger, _callback)
+
+    # private
+    def _index(self, day):
+        k = -1 if self._first_year is None else day.year - self._first_year
+        if not 0 <= k < self._year_count:
+            return None
+        return k * yearlayout.DAYS_MAX + day.toordinal() - self._first_ordinals[k]
+
+    def _tile_at(self, index):
+        k, day = divmod(index, yearlayout.DAYS_MAX)
+        return self._blocks[k] + day
+
+    def _create_block(self):
+        k = len(self._blocks)
+        tags = ('mtile', 'block{}'.format(k))
+        tiles = [self._calgrid.create_rectangle(0, 0, 0, 0, outline=self._toutline,
+                                                fill=self._tbg, tags=tags)
+                 for _ in range(yearlayout.DAYS_MAX)]
+        # canvas ids are consecutive, tile of day d is tiles[0] + d
+        self._blocks.append(tiles[0])
+        self._block_layouts.append(None)
+        self._labels.append(self._calgrid.create_text(
+            self._label_width / 2, self._band * k + 7 * self._tsize / 2,
+            text='', fill=self._text_color))
+
+    def _show_block(self, k, year):
+        layout = yearlayout.year_layout(year)
+        self._calgrid.itemconfig(self._labels[k], text=str(year))
+        if layout is self._block_layouts[k]:
+            return
+        x0 = MultiYearGrid.POS_0 + self._label_width
+        y0 = MultiYearGrid.POS_0 + self._band * k
+        size = self._tsize
+        first = self._blocks[k]
+        for day in range(yearlayout.DAYS_MAX):
+            if day < layout.days():
+                col, row = layout.tiles[day]
+                self._calgrid.coords(first + day, x0 + size * col, y0 + size * row,
+                                     x0 + size * (col + 1), y0 + size * (row + 1))
+                self._calgrid.itemconfig(first + day, state='normal')
+            else:
+                self._calgrid.itemconfig(first + day, state='hidden')
+        self._block_layouts[k] = layout
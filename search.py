@@ -0,0 +1,280 @@
+"""
+Inverted index of activity sports and descriptions over all years.
+
+    python search.py 'sport:zwift interval*'
+    python search.py 'run AND (hill* OR track) NOT easy'
+
+Terms are lowercased words. A bare term matches sport or description,
+sport:term only the sport. Terms next to each other are ANDed, OR and
+NOT (or a leading -) combine them, a trailing * matches a prefix.
+Results are dates. The index is kept in a json file with a signature of
+each year's files, years changed outside the app are indexed again.
+"""
+from bisect import bisect_left
+from datetime import date
+import json
+import os
+import re
+import threading
+from file_util import atomic_write
+import metrics
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_TOKEN = re.compile(r'\(|\)|-|[^\s()]+')
+
+
+def terms(activities):
+    """
+    returns index terms of a day's str activities
+    """
+    result = set()
+    for activity in activities:
+        sport = activity[0] if activity else ''
+        for word in _WORD.findall(sport.lower()):
+            result.add(word)
+            result.add('sport:' + word)
+        for field in activity[4:5]:
+            result.update(_WORD.findall(field.lower()))
+    return result
+
+
+def parse_query(text):
+    """
+    returns query tree of nested ('and' | 'or', [nodes]), ('not', node),
+    ('term', word) and ('prefix', word) tuples
+    """
+    tokens = _TOKEN.findall(text)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_or():
+        nodes = [parse_and()]
+        while peek() == 'OR':
+            take()
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and():
+        nodes = []
+        while peek() not in (None, ')', 'OR'):
+            if peek() == 'AND':
+                take()
+                continue
+            nodes.append(parse_not())
+        if not nodes:
+            raise ValueError('empty query')
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_not():
+        if peek() in ('NOT', '-'):
+            take()
+            return ('not', parse_not())
+        if peek() is None:
+            raise ValueError('missing term')
+        token = take()
+        if token == '(':
+            node = parse_or()
+            if peek() != ')':
+                raise ValueError('missing )')
+            take()
+            return node
+        word = token.lower()
+        if word.endswith('*'):
+            return ('prefix', word.rstrip('*'))
+        return ('term', word)
+
+    tree = parse_or()
+    if pos != len(tokens):
+        raise ValueError('unexpected {}'.format(tokens[pos]))
+    return tree
+
+
+class SearchIndex:
+    """
+    Postings {term: set of day ordinals} built from {day ordinal: terms}
+    """
+
+    def __init__(self, filename='search_index.json'):
+        self._filename = filename
+        self._days = {}
+        self._postings = {}
+        self._sorted_terms = None
+        # {year: signature of the year's files when it was indexed}
+        self._signatures = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if os.path.isfile(filename):
+            with open(filename) as f:
+                saved = json.load(f)
+            self._signatures = {int(y): s for y, s in saved.get('signatures', {}).items()}
+            for day, day_terms in saved.get('days', {}).items():
+                self._add(int(day), set(day_terms))
+
+    def update_day(self, day, activities):
+        """
+        indexes str activities of day in place of what it had
+        """
+        with self._lock:
+            self._remove(day.toordinal())
+            self._add(day.toordinal(), terms(activities))
+            self._dirty = True
+
+    def index_year(self, year, store, signature=None):
+        """
+        replaces index of year with days of store
+        """
+        first, last = date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+        with self._lock:
+            for ordinal in [d for d in self._days if first <= d <= last]:
+                self._remove(ordinal)
+            for day in store.dates():
+                self._add(day.toordinal(), terms(store.day(day)))
+            self._signatures[year] = signature
+            self._dirty = True
+
+    def refresh(self, storage):
+        """
+        indexes years whose files changed since they were indexed,
+        returns reindexed years
+        """
+        changed = []
+        for year in storage.years():
+            signature = file_signature(storage.year_files(year))
+            if self._signatures.get(year) != signature:
+                self.index_year(year, storage.read_year(year), signature)
+                changed.append(year)
+        return changed
+
+    def mark_saved(self, storage, years):
+        """
+        records the current signatures of years whose saved days were all
+        indexed with update_day, and of years sharing their files that
+        were up to date
+        """
+        shared = {}
+        for year in years:
+            for filename in storage.year_files(year):
+                shared.setdefault(filename, set()).add(year)
+        with self._lock:
+            fresh = [self._signatures[y] for y in years if y in self._signatures]
+            for year in storage.years():
+                files = storage.year_files(year)
+                if year in years or (any(f in shared for f in files) and
+                                     self._signatures.get(year) in fresh):
+                    self._signatures[year] = file_signature(files)
+                    self._dirty = True
+
+    @metrics.timed('search.query')
+    def search(self, query):
+        """
+        returns sorted dates matching query text
+        """
+        tree = parse_query(query)
+        with self._lock:
+            ordinals = self._evaluate(tree)
+        return [date.fromordinal(d) for d in sorted(ordinals)]
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            saved = {'signatures': self._signatures,
+                     'days': {str(d): sorted(t) for d, t in self._days.items()}}
+            self._dirty = False
+        with atomic_write(self._filename) as f:
+            json.dump(saved, f, separators=(',', ':'), sort_keys=True)
+
+    # private
+    def _add(self, ordinal, day_terms):
+        if not day_terms:
+            return
+        self._days[ordinal] = day_terms
+        for term in day_terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = set()
+                self._sorted_terms = None
+            postings.add(ordinal)
+
+    def _remove(self, ordinal):
+        for term in self._days.pop(ordinal, ()):
+            postings = self._postings[term]
+            postings.discard(ordinal)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+
+    def _evaluate(self, node):
+        kind, value = node
+        if kind == 'term':
+            return self._postings.get(value, set())
+        if kind == 'prefix':
+            return self._prefix(value)
+        if kind == 'not':
+            return set(self._days) - self._evaluate(value)
+        if kind == 'or':
+            result = set()
+            for n in value:
+                result |= self._evaluate(n)
+            return result
+        # intersects the smallest postings first, NOT parts are subtracted
+        positive = sorted((self._evaluate(n) for n in value if n[0] != 'not'), key=len)
+        result = set(positive[0]) if positive else set(self._days)
+        for postings in positive[1:]:
+            result &= postings
+        for n in value:
+            if n[0] == 'not':
+                result -= self._evaluate(n[1])
+        return result
+
+    def _prefix(self, prefix):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        result = set()
+        i = bisect_left(self._sorted_terms, prefix)
+        while i < len(self._sorted_terms) and self._sorted_terms[i].startswith(prefix):
+            result |= self._postings[self._sorted_terms[i]]
+            i += 1
+        return result
+
+
+def file_signature(filenames):
+    signature = []
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+            signature.append([stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            signature.append(None)
+    return signature
+
+
+def main(argv=None):
+    import argparse
+    from config import Config
+    from storage import open_storage
+    parser = argparse.ArgumentParser(description='Search activities')
+    parser.add_argument('query')
+    args = parser.parse_args(argv)
+
+    cfg = Config()
+    storage = open_storage(cfg)
+    try:
+        index = SearchIndex(cfg.search_index_filename)
+        index.refresh(storage)
+        index.save()
+    finally:
+        storage.close()
+    for day in index.search(args.query):
+        print(day)
+
+
+if __name__ == "__main__":
+    main()
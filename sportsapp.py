@@ -1,27 +1,62 @@
 from gui import Gui
 from config import Config
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from copy import copy
-from operator import add
-from functools import reduce
-from timedelta_util import timedelta_from_hh_mm
 from color_util import rgb_to_hex
-from date_util import roll_year, date_from_str
-import os.path
-import csv
+from date_util import roll_year
+from model import ActivityStore, invalid_fields
+from storage import open_storage
+from writer import BackgroundWriter
+from date_util import date_from_str
+import threading
+import metrics
+import time
+from summary import Summary
+from yearcache import YearCache, YearEntry
+# backup and sync modules are imported when first used
+
+# ui thread time spent coloring tiles before the window gets to redraw
+COLOR_BUDGET_S = 0.008
+LOAD_POLL_MS = 15
 
 class Sportsapp():
 
     def __init__(self, date):
-        self._activities = {}
+        self._activities = ActivityStore()
+        # None while the shown year is loading
+        self._year = None
+        self._loading = None
+        self._coloring = None
         self._current_date = copy(date)
         self._selected_date = copy(date)
 
         # components
         self._cfg = Config()
+        self._storage = open_storage(self._cfg)
+        self._writer = BackgroundWriter(self._storage)
+        self._polling_writer = False
+        self._backup = None
+        self._backup_thread = None
+        self._sync_state = None
+        self._sync_thread = None
+        self._sync_result = None
+        self._years_thread = None
+        self._tracks = None
+        # search index is loaded and brought up to date on a worker thread,
+        # days saved meanwhile wait in _search_pending
+        self._search = None
+        self._search_thread = None
+        self._search_pending = {}
+        # years whose saves went through index_day, their signatures are
+        # recorded at exit so they are not reindexed at the next start
+        self._indexed_years = set()
+        self._query = None
+        self._hits = ()
+        self._years = YearCache(self.load_year, self._cfg.year_cache_max_bytes)
         self._ui = Gui(date.year, sorted(self._cfg.activity_defaults_sports),
                        self._cfg.activity_defaults_headers,
-                       calgrid_bg_tile_color=rgb_to_hex(self._cfg.min_color))
+                       calgrid_bg_tile_color=rgb_to_hex(self._cfg.min_color),
+                       grid_backend=self._cfg.grid_backend)
         # bindings
         self._ui.on_select_date(self.select_date)
         self._ui.on_over_date(self.show_date)
@@ -30,43 +65,391 @@ class Sportsapp():
         self._ui.on_next_year(self.next_year)
         self._ui.on_prev_year(self.prev_year)
         self._ui.on_save(self.save)
-        # TODO bind backup to program Exit -> in _ui.on_closing
-        # self.create_backup_file()
+        self._ui.on_sync(self.sync)
+        self._ui.on_years(self.show_years)
+        self._ui.on_search(self.search)
+        self._ui.on_exit(self.shutdown)
+        self._ui.after(self._cfg.backup_interval_ms, self.backup_timer)
+        self._cfg_version = self._cfg.version
+        self._ui.after(2000, self.config_timer)
+        if metrics.overlay:
+            self._ui.after(500, self.metrics_timer)
 
-        self.load_activities_from_file()
-        self.color_grid()
+        # blank grid is shown right away, the year is colored once loaded
         self.select_date(self._selected_date)
-        
+        self.load_activities_from_file()
+        self.load_search_index()
+
+    def loop(self):
+        self._ui.loop()
+
     def load_activities_from_file(self):
-        filename = self._cfg.activity_filename(self._selected_date)
-        if not (os.path.exists(filename) and os.path.isfile(filename)):
-            open(filename, 'a').close()
-        
-        with open(filename, 'r') as csv_file:
-            reader = csv.reader(csv_file, delimiter='|')
-            for row in reader:
-                if row:
-                    self._activities.setdefault(date_from_str(row[0]), []).append(tuple(row[1:]))
+        """
+        loads selected year on a worker thread, show_year runs when it is done
+        """
+        year = self._selected_date.year
+        self._year = None
+        self._activities = ActivityStore()
+        self._loading = token = object()
+        # the table is replaced once the year is shown, edits would be lost
+        self._ui.disable_save()
+        self._ui.disable_add()
+        if year in self._years:
+            self.show_year(self._years.get(year))
+            return
+        result = {}
+
+        def run():
+            try:
+                result['entry'] = self._years.get(year)
+            except Exception as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=run, name='year-load', daemon=True)
+        thread.start()
+        self._ui.set_save_status_label('loading…', 'orange')
+        self._ui.after(LOAD_POLL_MS, lambda: self.poll_load(token, thread, result))
+
+    def poll_load(self, token, thread, result):
+        if token is not self._loading:
+            # another year was selected meanwhile
+            return
+        if thread.is_alive():
+            self._ui.after(LOAD_POLL_MS,
+                           lambda: self.poll_load(token, thread, result))
+        elif 'error' in result:
+            self._ui.set_save_status_label('load error: {}'.format(result['error']),
+                                           'red')
+        else:
+            self.show_year(result['entry'])
+
+    def show_year(self, entry):
+        if entry.colors_version != self._cfg.version:
+            # cached before the config was reloaded
+            self.recolor(entry)
+        self._loading = None
+        self._year = entry
+        self._activities = entry.store
+        self._years.prefetch(entry.year + 1, entry.year - 1)
+        self.select_date(self._selected_date)
+        self._ui.enable_save()
+        if self._ui.workout_count() < 10:
+            self._ui.enable_add()
+        self.color_grid()
+
+    @metrics.timed('app.load_year')
+    def load_year(self, year):
+        """
+        loads year from storage, runs in the prefetch thread too
+        so it must not touch the ui
+        """
+        # queued saves of an evicted year must not be read back stale
+        self._writer.flush()
+        activities = self._storage.load_year(year)
+        entry = YearEntry(year, activities, None, Summary.from_store(year, activities))
+        self.recolor(entry)
+        return entry
+
+    def recolor(self, entry):
+        """
+        computes tile colors of entry with the current color ramp
+        """
+        # version is read first, a reload in between recolors once more
+        version = self._cfg.version
+        days, totals = entry.store.daily_minutes()
+        entry.colors = dict(zip(map(date.fromordinal, days),
+                                self._cfg.color_ramp.colors(totals)))
+        entry.colors_version = version
 
     def color_grid(self):
-        for activity_date in self._activities.keys():
-            self.update_calgrid_color(activity_date)
-        
+        """
+        colors tiles in slices of COLOR_BUDGET_S so the window stays responsive,
+        summary is drawn after the last slice
+        """
+        self._coloring = token = object()
+        self.color_slice(token, list(self._year.colors.items()), 0)
+
+    @metrics.timed('app.color_slice')
+    def color_slice(self, token, items, start):
+        if token is not self._coloring or self._year is None:
+            return
+        deadline = time.perf_counter() + COLOR_BUDGET_S
+        while start < len(items) and time.perf_counter() < deadline:
+            self._ui.color_dates(dict(items[start:start + 32]))
+            metrics.count('app.tiles_colored', len(items[start:start + 32]))
+            start += 32
+        if start < len(items):
+            self._ui.after(1, lambda: self.color_slice(token, items, start))
+        else:
+            self._coloring = None
+            self.show_summary()
+
+    @metrics.timed('app.show_summary')
+    def show_summary(self):
+        summary = self._year.summary
+        self._ui.show_summary(summary.weeks(), summary.months())
+
     def create_backup_file(self):
-        # create csv file if not existing
-        pass
+        """
+        snapshots activity files, only changed chunks are stored
+        """
+        if self._backup is None:
+            from backup import Backup
+            self._backup = Backup(self._cfg.backup_path)
+        self._backup.snapshot(self._storage.backup_files())
+
+    def backup_timer(self):
+        # snapshot runs off the ui thread, skipped while one is running
+        if not (self._backup_thread and self._backup_thread.is_alive()):
+            self._backup_thread = threading.Thread(target=self.create_backup_file,
+                                                   name='backup', daemon=True)
+            self._backup_thread.start()
+        self._ui.after(self._cfg.backup_interval_ms, self.backup_timer)
+
+    def config_timer(self):
+        # config files edited while running are picked up here
+        if self._year is not None and self._cfg.version != self._cfg_version:
+            self._cfg_version = self._cfg.version
+            self._ui.set_sports(sorted(self._cfg.activity_defaults_sports))
+            # other cached years are recolored when shown
+            self.recolor(self._year)
+            self.color_grid()
+        self._ui.after(2000, self.config_timer)
+
+    def metrics_timer(self):
+        # redraws queued by the last callbacks are timed here
+        with metrics.span('tk.update_idletasks'):
+            self._ui.update_idletasks()
+        self._ui.show_metrics(metrics.report())
+        self._ui.after(500, self.metrics_timer)
 
     def save_activites_to_file(self):
-        # clean up empty activities
-        self._activities = {date: act for date, act in self._activities.items() if act}
-        filename = self._cfg.activity_filename(self._selected_date)
-        with open(filename, 'w') as csv_file:
-            writer = csv.writer(csv_file, delimiter='|')
-            for date in sorted(self._activities.keys()):
-                for activity in self._activities[date]:
-                    act = list(activity)
-                    act.insert(0, date)
-                    writer.writerow(act)
+        # only the edited day is written, by the writer thread
+        self._writer.save_day(self._selected_date,
+                              self._activities.day(self._selected_date))
+        self._ui.set_save_status_label('saving…', 'orange')
+        if not self._polling_writer:
+            self._polling_writer = True
+            self._ui.after(50, self.poll_writer)
+
+    def poll_writer(self):
+        errors = [error for _, error in self._writer.results() if error]
+        if errors:
+            self._ui.set_save_status_label('error: {}'.format(errors[-1]), 'red')
+        if self._writer.busy():
+            self._ui.after(50, self.poll_writer)
+            return
+        self._polling_writer = False
+        if not self._writer.unsaved():
+            self._ui.set_save_status_label('Saved', 'gray')
+
+    def shutdown(self):
+        # writes everything still queued before the window goes away,
+        # days that still fail to save are reported and the user may
+        # keep the app open, a failed backup does not keep it open
+        self._writer.retry()
+        self._writer.flush()
+        errors = [error for _, error in self._writer.results() if error]
+        if self._writer.unsaved():
+            error = errors[-1] if errors else 'not saved'
+            text = '{} days could not be saved: {}\n\nClose anyway and lose them?'
+            if not self._ui.confirm('Save failed', text.format(self._writer.unsaved(),
+                                                               error)):
+                self._ui.set_save_status_label('error: {}'.format(error), 'red')
+                return False
+        self._writer.close()
+        if self._backup_thread:
+            self._backup_thread.join()
+        try:
+            self.create_backup_file()
+        except Exception as e:
+            self._ui.show_error('Backup failed', str(e))
+        if self._search_thread:
+            self._search_thread.join()
+        if self._search:
+            if not self._writer.unsaved():
+                self._search.mark_saved(self._storage, self._indexed_years)
+            self._search.save()
+        self._storage.close()
+        if metrics.enabled:
+            print(metrics.report())
+        if metrics.trace_filename:
+            metrics.export_trace(metrics.trace_filename)
+
+    def show_years(self):
+        """
+        shows years_span years up to the selected one stacked,
+        years are read on a worker thread
+        """
+        if self._years_thread and self._years_thread.is_alive():
+            return
+        last = self._selected_date.year
+        first = last - self._cfg.years_span + 1
+        ramp = self._cfg.color_ramp
+        result = {}
+
+        def run():
+            try:
+                # queued saves must be on disk before reading
+                self._writer.flush()
+                buckets = []
+                for year in range(first, last + 1):
+                    days, totals = self._storage.read_year(year).daily_minutes()
+                    buckets.extend(zip(map(date.fromordinal, days), ramp.buckets(totals)))
+                result['buckets'] = buckets
+            except Exception as e:
+                result['error'] = e
+
+        self._years_thread = threading.Thread(target=run, name='years', daemon=True)
+        self._years_thread.start()
+        self._ui.after(LOAD_POLL_MS, lambda: self.poll_years(first, last, ramp, result))
+
+    def poll_years(self, first, last, ramp, result):
+        if self._years_thread.is_alive():
+            self._ui.after(LOAD_POLL_MS,
+                           lambda: self.poll_years(first, last, ramp, result))
+        elif 'error' in result:
+            self._ui.set_save_status_label('years error: {}'.format(result['error']),
+                                           'red')
+        else:
+            self._ui.show_years(first, last, ramp.palette, result['buckets'],
+                                rgb_to_hex(ramp.min_rgb))
+
+    def load_search_index(self):
+        """
+        loads the search index and reindexes years changed since it was saved
+        """
+        from search import SearchIndex
+        result = {}
+
+        def run():
+            try:
+                self._writer.flush()
+                index = SearchIndex(self._cfg.search_index_filename)
+                index.refresh(self._storage)
+                result['index'] = index
+            except Exception as e:
+                result['error'] = e
+
+        self._search_thread = threading.Thread(target=run, name='search-index',
+                                               daemon=True)
+        self._search_thread.start()
+        self._ui.after(LOAD_POLL_MS, lambda: self.poll_search_index(result))
+
+    def poll_search_index(self, result):
+        if self._search_thread.is_alive():
+            self._ui.after(LOAD_POLL_MS, lambda: self.poll_search_index(result))
+        elif 'error' in result:
+            self._ui.set_save_status_label('index error: {}'.format(result['error']),
+                                           'red')
+        else:
+            self._search = result['index']
+            for day, activities in self._search_pending.items():
+                self._search.update_day(day, activities)
+            self._search_pending.clear()
+
+    def index_day(self, day, activities):
+        self._indexed_years.add(day.year)
+        if self._search is None:
+            self._search_pending[day] = activities
+            return
+        self._search.update_day(day, activities)
+        if self._query:
+            # the day may have started or stopped matching
+            self._hits = self._search.search(self._query)
+            self.highlight_hits()
+
+    @metrics.timed('app.search')
+    def search(self):
+        """
+        highlights days of all years matching the search text
+        """
+        text = self._ui.search_text().strip()
+        if not text:
+            self._query = None
+            self._hits = ()
+            self.highlight_hits()
+            return
+        if self._search is None:
+            self._ui.set_save_status_label('indexing…', 'orange')
+            return
+        try:
+            self._hits = self._search.search(text)
+        except ValueError as e:
+            self._ui.set_save_status_label('search: {}'.format(e), 'red')
+            return
+        self._query = text
+        self.highlight_hits()
+        years = len({day.year for day in self._hits})
+        status = '{} days in {} years'.format(len(self._hits), years)
+        self._ui.set_save_status_label(status, 'gray')
+
+    def highlight_hits(self):
+        year = self._selected_date.year
+        self._ui.highlight_dates([day for day in self._hits if day.year == year])
+
+    def sync(self):
+        """
+        syncs the shown year on a worker thread, pulled days are
+        applied on the ui thread by apply_sync
+        """
+        if self._year is None or (self._sync_thread and self._sync_thread.is_alive()):
+            return
+        from sync import SyncClient, SyncState, sync_year
+        if self._sync_state is None:
+            self._sync_state = SyncState(self._cfg.sync_state_filename)
+        entry, snapshot = self._year, self._activities.copy()
+        base = self._sync_state.base(entry.year)
+        client = SyncClient(self._cfg.sync_url)
+
+        def run():
+            try:
+                self._sync_result = sync_year(client, snapshot, entry.year, base)
+            except Exception as e:
+                self._sync_result = e
+
+        self._ui.set_save_status_label('syncing…', 'orange')
+        self._sync_thread = threading.Thread(target=run, name='sync', daemon=True)
+        self._sync_thread.start()
+        self._ui.after(100, lambda: self.poll_sync(entry))
+
+    def poll_sync(self, entry):
+        if self._sync_thread.is_alive():
+            self._ui.after(100, lambda: self.poll_sync(entry))
+        elif isinstance(self._sync_result, Exception):
+            self._ui.set_save_status_label('sync error: {}'.format(self._sync_result),
+                                           'red')
+        else:
+            self.apply_sync(entry, self._sync_result)
+
+    def apply_sync(self, entry, result):
+        from sync import day_hash
+        synced = dict(result.synced)
+        conflicts = list(result.conflicts)
+        for day_str, activities in result.pulled.items():
+            day = date_from_str(day_str)
+            # skip days edited while syncing
+            if day_hash(entry.store.day(day)) != result.replaced[day_str]:
+                conflicts.append(day_str)
+                continue
+            old_values = entry.store.day_values(day)
+            entry.store.set_day(day, activities)
+            entry.summary.update_day(day, old_values, entry.store.day_values(day))
+            entry.colors[day] = self.tile_color(entry.store.day_minutes(day))
+            self._writer.save_day(day, entry.store.day(day))
+            self.index_day(day, entry.store.day(day))
+            synced[day_str] = day_hash(entry.store.day(day))
+        self._sync_state.update(result.year, synced)
+        self._sync_state.save()
+        if entry is self._year:
+            self.color_grid()
+            if str(self._selected_date) in result.pulled:
+                self.activities_load_to_table()
+        if conflicts:
+            self._ui.set_save_status_label('{} conflicts'.format(len(conflicts)), 'red')
+        else:
+            self._ui.set_save_status_label('synced ↑{} ↓{}'.format(
+                result.pushed, len(result.pulled)), 'gray')
 
     def next_year(self):
         self._selected_date = roll_year(self._selected_date, 1)
@@ -76,57 +459,85 @@ class Sportsapp():
         self._selected_date = roll_year(self._selected_date, -1)
         self.change_year(self._selected_date)
 
+    @metrics.timed('app.change_year')
     def change_year(self, date):
         self._ui.load_cal_grid(date.year)
-        self._ui.on_over_date(self.show_date)
-        self._ui.on_select_date(self.select_date)
         self._ui.set_season_label(date.year)
-        self._activities = {}
-        self.load_activities_from_file()
-        self.color_grid()
+        self.highlight_hits()
         self.select_date(date)
+        self.load_activities_from_file()
 
+    @metrics.timed('app.select_date')
     def select_date(self, date, *_):
         self._selected_date = date
-        self._ui.remove_all_activities()
         self._ui.select_date(self._selected_date)
         self._ui.set_date_label(self._selected_date)
-        self._ui.set_save_status_label('Saved', 'gray')
+        if not (self._writer.busy() or self._writer.unsaved()):
+            self._ui.set_save_status_label('Saved', 'gray')
         self.activities_load_to_table()
+        # the first route preview waits for the first shown year, it reads
+        # the track directory and may render a thumbnail
+        if self._year is not None:
+            self.show_route()
+
+    @metrics.timed('app.show_route')
+    def show_route(self):
+        # thumbnails come from simplified levels and are cached by the track store,
+        # a track belongs to the activity whose description ends with its id
+        from tracks import description_track_id
+        tracks = self.track_store()
+        stored = tracks.ids(self._selected_date)
+        ids = [description_track_id(activity[4])
+               for activity in self._activities.day(self._selected_date)
+               if len(activity) > 4]
+        ids = [i for i in ids if i in stored]
+        self._ui.show_route(tracks.thumbnail(self._selected_date, ids[0])
+                            if ids else None)
+
+    def track_store(self):
+        if self._tracks is None:
+            from tracks import TrackStore
+            self._tracks = TrackStore(self._cfg.track_path)
+        return self._tracks
 
+    @metrics.timed('app.show_date')
     def show_date(self, date, tile_id):
         # print('over: {} coords {}'.format(date, tile_id))
-        self._ui._cal_grid.remove_text()
-        self._ui._cal_grid.set_text_to_tile(tile_id, date.day)
+        self._ui.hover_date(tile_id, date.day)
 
+    @metrics.timed('app.save')
     def save(self):
+        if self._year is None:
+            self._ui.set_save_status_label('loading, not saved', 'red')
+            return
         activities = tuple([self.sanitize_delimiter(activity)
                             for activity in self._ui.export_workouts()])
-        
-        self._activities[self._selected_date] = activities
+        invalid = sorted({name for activity in activities
+                          for name in invalid_fields(activity)})
+        if invalid:
+            # typed columns would keep these as 0, the user fixes them first
+            self._ui.set_save_status_label('invalid {}'.format(', '.join(invalid)), 'red')
+            return
+
+        old_values = self._activities.day_values(self._selected_date)
+        self._activities.set_day(self._selected_date, activities)
+        self._year.summary.update_day(self._selected_date, old_values,
+                                      self._activities.day_values(self._selected_date))
         self.update_calgrid_color(self._selected_date)
-        self._ui.set_save_status_label('Saved', 'gray')
+        self.show_summary()
         self.save_activites_to_file()
+        self.index_day(self._selected_date, self._activities.day(self._selected_date))
 
-    def sum_activity_duration(self, activities) -> timedelta:
-        try:
-            if not activities:
-                return timedelta(0)
-            duration_index = self._cfg.activity_defaults_headers.index('duration')
-            activity_durations = [timedelta_from_hh_mm(activity[duration_index])
-                                  for activity in activities]
-            return reduce(add, activity_durations)
-        except ValueError:
-            return timedelta(0)
+    def tile_color(self, minutes):
+        return self._cfg.color_ramp.color(minutes)
 
     def update_calgrid_color(self, date):
-        td = self.sum_activity_duration(self._activities.get(date, []))
-        self._ui.color_date(date, rgb_to_hex(self._cfg.determine_color(td)))
+        color = self.tile_color(self._activities.day_minutes(date))
+        self._year.colors[date] = color
+        self._ui.color_date(date, color)
 
     def activities_load_to_table(self):
-        activities = self._activities.get(self._selected_date, [])
-        for activity in activities:
-            self._ui.add_activity(*activity)
+        self._ui.load_activities(self._activities.day(self._selected_date))
 
     def add_activity(self):
         # print(self._ui.workout_type())
@@ -149,10 +560,12 @@ class Sportsapp():
         """ removes delimiters from list of activities (tuples) """
         return [attr.replace(delimiter, '') for attr in activity]
 
-        
 
 
-s = Sportsapp(datetime.now().date())
+def main():
+    app = Sportsapp(datetime.now().date())
+    app.loop()
+
 
 if __name__ == "__main__":
-    s._ui.loop()
+    main()
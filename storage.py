@@ -0,0 +1,266 @@
+"""
+Activity storage backends. Both load a year into an ActivityStore and
+save single days:
+
+    storage.load_year(2018) -> ActivityStore
+    storage.save_day(date, activities)
+
+Existing csv years (with their journals) are imported into sqlite with
+
+    python storage.py migrate activities --db activities.db
+"""
+from datetime import date
+import glob
+import os
+import re
+import threading
+from date_util import ordinal_from_str
+from journal import Journal
+import metrics
+from model import ActivityStore, parse_fields
+
+
+class CsvStorage:
+    """
+    One csv file per year, saves go to the year's journal
+    """
+
+    def __init__(self, csv_prefix='activities', journal_max_size=64 * 1024):
+        self._csv_prefix = csv_prefix
+        self._journal_max_size = journal_max_size
+        self._journals = {}
+        self._lock = threading.Lock()
+
+    def filename(self, year):
+        return "{}_{}.csv".format(self._csv_prefix, year)
+
+    def years(self):
+        pattern = re.compile(re.escape(self._csv_prefix) + r'_(\d{4})\.(csv|journal)$')
+        names = glob.glob('{}_*.*'.format(self._csv_prefix))
+        return sorted({int(m.group(1)) for m in map(pattern.match, names) if m})
+
+    def load_year(self, year):
+        journal = self._journal(year)
+        store = journal.load()
+        if journal.needs_compaction():
+            journal.compact()
+        return store
+
+    def read_year(self, year):
+        """
+        loads year for reading only, does not start a journal compaction
+        """
+        return self._journal(year).load()
+
+    def save_day(self, day, activities):
+        self.save_days({day: activities})
+
+    def save_days(self, activities_by_date):
+        """
+        saves several days, one journal write per year
+        """
+        by_year = {}
+        for day, activities in activities_by_date.items():
+            by_year.setdefault(day.year, {})[day] = activities
+        for year, days in by_year.items():
+            journal = self._journal(year)
+            journal.append_days(days)
+            if journal.needs_compaction():
+                journal.compact()
+
+    def year_files(self, year):
+        """
+        returns files whose changes change year
+        """
+        return [self.filename(year), self._journal(year).filename]
+
+    def backup_files(self):
+        """
+        returns files holding the activity data
+        """
+        return sorted(name for year in self.years()
+                      for name in (self.filename(year), self._journal(year).filename)
+                      if os.path.isfile(name))
+
+    def close(self):
+        with self._lock:
+            journals = list(self._journals.values())
+        for journal in journals:
+            journal.wait()
+
+    # private
+    def _journal(self, year):
+        with self._lock:
+            journal = self._journals.get(year)
+            if journal is None:
+                journal = self._journals[year] = Journal(self.filename(year),
+                                                         self._journal_max_size)
+            return journal
+
+
+class SqliteStorage:
+    """
+    All years in one sqlite database in WAL mode, indexed by date
+    and by sport and date
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS activities (
+            date TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            sport TEXT NOT NULL,
+            minutes INTEGER NOT NULL,
+            distance REAL NOT NULL,
+            intensity INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            PRIMARY KEY (date, position)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS activities_sport_date ON activities (sport, date);
+    """
+    # statements are kept constant so sqlite3 reuses them prepared
+    SELECT_RANGE = ("SELECT date, sport, minutes, distance, intensity, description "
+                    "FROM activities WHERE date BETWEEN ? AND ? ORDER BY date, position")
+    SELECT_SPORT_RANGE = ("SELECT date, sport, minutes, distance, intensity, description "
+                          "FROM activities WHERE sport = ? AND date BETWEEN ? AND ? "
+                          "ORDER BY date, position")
+    # plain insert after a delete, upsert needs sqlite 3.24
+    INSERT = "INSERT INTO activities VALUES (?, ?, ?, ?, ?, ?, ?)"
+    DELETE_DAY = "DELETE FROM activities WHERE date = ?"
+    DELETE_RANGE = "DELETE FROM activities WHERE date BETWEEN ? AND ?"
+    SELECT_YEARS = "SELECT DISTINCT substr(date, 1, 4) FROM activities ORDER BY 1"
+
+    def __init__(self, filename='activities.db'):
+        # imported here, csv users do not pay for it at startup
+        import sqlite3
+        self._filename = filename
+        # used from the writer and prefetch threads, guarded by _lock
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(self.SCHEMA)
+
+    @property
+    def filename(self):
+        return self._filename
+
+    def years(self):
+        with self._lock:
+            return [int(year) for (year,) in self._db.execute(self.SELECT_YEARS)]
+
+    @metrics.timed('sqlite.load_year')
+    def load_year(self, year):
+        return ActivityStore.from_values(self._values(self.activities(
+            date(year, 1, 1), date(year, 12, 31))))
+
+    read_year = load_year
+
+    def activities(self, first, last, sport=None):
+        """
+        returns (date str, sport, minutes, distance, intensity, description)
+        rows between first and last date, across years
+        """
+        with self._lock:
+            if sport is None:
+                return self._db.execute(self.SELECT_RANGE,
+                                        (str(first), str(last))).fetchall()
+            return self._db.execute(self.SELECT_SPORT_RANGE,
+                                    (sport, str(first), str(last))).fetchall()
+
+    def save_day(self, day, activities):
+        self.save_days({day: activities})
+
+    def save_days(self, activities_by_date):
+        """
+        saves several days in one transaction
+        """
+        with self._lock, self._db:
+            for day, activities in activities_by_date.items():
+                rows = [self._row(day, i, parse_fields(day.toordinal(), activity))
+                        for i, activity in enumerate(activities)]
+                self._db.execute(self.DELETE_DAY, (str(day),))
+                self._db.executemany(self.INSERT, rows)
+
+    def import_store(self, year, store):
+        """
+        replaces year with activities of store in one transaction
+        """
+        rows, position, last = [], 0, None
+        for values in store.values():
+            position = position + 1 if values[0] == last else 0
+            last = values[0]
+            rows.append(self._row(date.fromordinal(values[0]), position, values))
+        with self._lock, self._db:
+            self._db.execute(self.DELETE_RANGE,
+                             (str(date(year, 1, 1)), str(date(year, 12, 31))))
+            self._db.executemany(self.INSERT, rows)
+        return len(rows)
+
+    def year_files(self, year):
+        return [self._filename, self._filename + '-wal']
+
+    def backup_files(self):
+        # moves committed pages from the wal into the database file
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return [self._filename]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # private
+    def _row(self, day, position, values):
+        return (str(day), position) + tuple(values[1:])
+
+    def _values(self, rows):
+        for row in rows:
+            yield (ordinal_from_str(row[0]),) + tuple(row[1:])
+
+
+def open_storage(cfg):
+    if cfg.storage == 'sqlite':
+        return SqliteStorage(cfg.sqlite_filename)
+    return CsvStorage(cfg.csv_prefix, cfg.journal_max_size)
+
+
+def migrate(csv_prefix, db_filename):
+    """
+    imports csv years of csv_prefix (with their journals) into sqlite,
+    years kept only in a journal included
+    """
+    csv_storage = CsvStorage(csv_prefix)
+    db = SqliteStorage(db_filename)
+    try:
+        for year in csv_storage.years():
+            store = csv_storage.read_year(year)
+            raw_dates = store.raw_dates()
+            if raw_dates:
+                # sqlite keeps typed columns only, these rows would become 0
+                print('{}: not imported, fix values on {}'.format(
+                    year, ', '.join(map(str, raw_dates))))
+                continue
+            count = db.import_store(year, store)
+            print('{}: {} activities'.format(year, count))
+    finally:
+        db.close()
+        csv_storage.close()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Activity storage tools')
+    commands = parser.add_subparsers(dest='command')
+    migrate_cmd = commands.add_parser('migrate', help='import csv years into sqlite')
+    migrate_cmd.add_argument('csv_prefix', nargs='?', default='activities',
+                             help='year files are <csv_prefix>_<year>.csv')
+    migrate_cmd.add_argument('--db', default='activities.db')
+    args = parser.parse_args(argv)
+    if args.command == 'migrate':
+        migrate(args.csv_prefix, args.db)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+from datetime import date
+import yearlayout
+
+
+class Summary:
+    """
+    Weekly and monthly totals per sport of one year, updated day by day.
+    Totals are [minutes, distance, load], load is minutes * intensity.
+    """
+
+    def __init__(self, year):
+        self._year = year
+        # (week column, sport) -> totals, columns as in CalendarGrid
+        self._weeks = {}
+        # (month, sport) -> totals
+        self._months = {}
+
+    @classmethod
+    def from_store(cls, year, store):
+        summary = cls(year)
+        first, last = date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+        names = store.sport_names
+        for ordinal, sport, minutes, distance, intensity in zip(
+                store.days, store.sports, store.minutes, store.distance, store.intensity):
+            if first <= ordinal <= last:
+                summary._add(date.fromordinal(ordinal),
+                             (names[sport], minutes, distance, intensity), 1)
+        return summary
+
+    def update_day(self, day, old_activities, new_activities):
+        """
+        replaces totals of day, activities are typed
+        (sport, minutes, distance, intensity) as from ActivityStore.day_values
+        """
+        for activity in old_activities:
+            self._add(day, activity, -1)
+        for activity in new_activities:
+            self._add(day, activity, 1)
+
+    def weeks(self, total=0):
+        """
+        returns list of 54 sums, one per grid column, total index 0 is
+        minutes, 1 distance and 2 load
+        """
+        values = [0] * 54
+        for (col, _), totals in self._weeks.items():
+            values[col] += totals[total]
+        return values
+
+    def months(self, total=0):
+        values = [0] * 12
+        for (month, _), totals in self._months.items():
+            values[month - 1] += totals[total]
+        return values
+
+    def by_sport(self, total=0):
+        values = {}
+        for (_, sport), totals in self._months.items():
+            values[sport] = values.get(sport, 0) + totals[total]
+        return values
+
+    # private
+    def _add(self, day, activity, sign):
+        sport, minutes, distance, intensity = activity
+        week = yearlayout.week_column(self._year, day)
+        for table, key in ((self._weeks, (week, sport)),
+                           (self._months, (day.month, sport))):
+            totals = table.setdefault(key, [0, 0.0, 0])
+            totals[0] += sign * minutes
+            totals[1] += sign * distance
+            totals[2] += sign * minutes * intensity
+            if not totals[0] and not totals[2] and abs(totals[1]) < 1e-9:
+                del table[key]
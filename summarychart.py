@@ -0,0 +1,62 @@
+from tkinter import Canvas, Frame
+import calendar
+from datetime import date
+from timedelta_util import minutes_to_hh_mm
+import yearlayout
+
+
+class SummaryChart(Frame):
+    """
+    Bar per week column aligned with CalendarGrid and month totals below.
+    Items are created once, show() only moves bars and changes texts
+    that differ from what is drawn.
+    """
+    WEEKS = 54
+    POS_0 = 1
+
+    def __init__(self, parent=None, tile_size=22, height=60,
+                 bg='#d9d9d9', bar='#ff9f2c', text='#404040'):
+        Frame.__init__(self, parent)
+        self._tsize = tile_size
+        self._bar_height = height
+        self._chart = Canvas(self, bg=bg, bd=0, highlightthickness=0,
+                             width=SummaryChart.WEEKS * tile_size + 2,
+                             height=height + tile_size)
+        self._chart.pack()
+        self._bars = [self._chart.create_rectangle(0, 0, 0, 0, fill=bar, outline='')
+                      for _ in range(SummaryChart.WEEKS)]
+        self._labels = [self._chart.create_text(0, height + tile_size / 2,
+                                                text='', fill=text)
+                        for _ in range(12)]
+        self._weeks = [None] * SummaryChart.WEEKS
+        self._months = [None] * 12
+        self._scale = None
+
+    def set_year(self, year):
+        """
+        centers month labels under the month's week columns
+        """
+        for month, label in enumerate(self._labels, 1):
+            last_day = calendar.monthrange(year, month)[1]
+            first_col = yearlayout.week_column(year, date(year, month, 1))
+            last_col = yearlayout.week_column(year, date(year, month, last_day))
+            x = SummaryChart.POS_0 + self._tsize * (first_col + last_col + 1) / 2
+            self._chart.coords(label, x, self._bar_height + self._tsize / 2)
+
+    def show(self, week_minutes, month_minutes):
+        scale = max(max(week_minutes), 60)
+        if scale != self._scale:
+            self._scale = scale
+            self._weeks = [None] * SummaryChart.WEEKS
+        for col, minutes in enumerate(week_minutes):
+            if minutes != self._weeks[col]:
+                self._weeks[col] = minutes
+                x0 = SummaryChart.POS_0 + self._tsize * col
+                top = self._bar_height * (1 - minutes / scale)
+                self._chart.coords(self._bars[col], x0 + 2, top, x0 + self._tsize - 2,
+                                   self._bar_height)
+        for month, minutes in enumerate(month_minutes):
+            if minutes != self._months[month]:
+                self._months[month] = minutes
+                self._chart.itemconfig(self._labels[month],
+                                       text=minutes_to_hh_mm(minutes) if minutes else '')
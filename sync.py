@@ -0,0 +1,202 @@
+"""
+Delta sync of activities between machines.
+
+Each side hashes every day, days into months and months into a year
+root. Only months whose hash differs are compared day by day and only
+differing days are sent. A day changed on both sides since the last sync
+is a conflict and is left untouched.
+"""
+import hashlib
+import json
+import os
+import urllib.request
+import zlib
+from date_util import date_from_str
+from file_util import atomic_write
+
+EMPTY = ''
+PUSH_BATCH = 200
+
+
+def day_hash(activities):
+    """
+    returns hash of a day's str activities, EMPTY for no activities
+    """
+    if not activities:
+        return EMPTY
+    text = '\n'.join('|'.join(activity) for activity in activities)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+class YearTree:
+    """
+    Merkle-style hashes of one year: days -> months -> root
+    """
+
+    def __init__(self, day_hashes):
+        # {'2018-05-18': hash}, days without activities are left out
+        self.days = {day: h for day, h in day_hashes.items() if h != EMPTY}
+        by_month = {}
+        for day in sorted(self.days):
+            by_month.setdefault(int(day[5:7]), []).append(
+                '{}={}'.format(day, self.days[day]))
+        self.months = {month: self._hash('\n'.join(lines))
+                       for month, lines in by_month.items()}
+        self.root = self._hash('\n'.join('{}={}'.format(m, h)
+                                         for m, h in sorted(self.months.items())))
+
+    @classmethod
+    def from_store(cls, store, year):
+        return cls({str(day): day_hash(store.day(day))
+                    for day in store.dates() if day.year == year})
+
+    def diff_months(self, months):
+        """
+        returns months whose hash differs from months {month: hash}
+        """
+        return sorted(m for m in set(self.months) | set(months)
+                      if self.months.get(m) != months.get(m))
+
+    def month_days(self, months):
+        return {day: h for day, h in self.days.items() if int(day[5:7]) in months}
+
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def plan(local, remote, base):
+    """
+    compares {day: hash} of local, remote and last synced base,
+    returns (push, pull, conflicts) lists of days
+    """
+    push, pull, conflicts = [], [], []
+    for day in sorted(set(local) | set(remote)):
+        mine, theirs = local.get(day, EMPTY), remote.get(day, EMPTY)
+        if mine == theirs:
+            continue
+        parent = base.get(day, EMPTY)
+        if parent == theirs:
+            push.append(day)
+        elif parent == mine:
+            pull.append(day)
+        else:
+            conflicts.append(day)
+    return push, pull, conflicts
+
+
+def encode(payload):
+    return zlib.compress(json.dumps(payload).encode('utf-8'))
+
+
+def decode(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+class SyncClient:
+    """
+    Talks to a sync server (see syncserver.py), bodies are zlib compressed json
+    """
+
+    def __init__(self, url, timeout=30):
+        self._url = url.rstrip('/')
+        self._timeout = timeout
+
+    def diff(self, year, months):
+        """
+        sends month hashes, returns remote root, differing months
+        and remote {day: hash} of those months
+        """
+        reply = self._post('/diff', {'year': year, 'months': months})
+        return reply['root'], reply['months'], reply['days']
+
+    def pull(self, year, days):
+        return self._post('/pull', {'year': year, 'days': days})['days']
+
+    def push(self, year, days, expected):
+        """
+        sends {day: activities}, server applies a day only if its hash
+        is still expected[day], returns (accepted, conflicts) days
+        """
+        reply = self._post('/push', {'year': year, 'days': days, 'expected': expected})
+        return reply['accepted'], reply['conflicts']
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(self._url + path, data=encode(payload),
+                                         headers={'Content-Type': 'application/json',
+                                                  'Content-Encoding': 'deflate'})
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:
+            return decode(response.read())
+
+
+class SyncResult:
+
+    def __init__(self, year):
+        self.year = year
+        # {day: hash} now equal on both sides
+        self.synced = {}
+        self.pushed = 0
+        # {day: activities} to apply locally, with hashes they replace
+        self.pulled = {}
+        self.replaced = {}
+        self.conflicts = []
+
+
+def sync_year(client, store, year, base):
+    """
+    syncs year of store (a snapshot, it is not modified) with the server,
+    base is {day: hash} of the last sync, returns SyncResult
+    """
+    result = SyncResult(year)
+    tree = YearTree.from_store(store, year)
+    remote_root, months, remote_days = client.diff(year, {str(m): h for m, h
+                                                          in tree.months.items()})
+    if remote_root == tree.root:
+        return result
+    local_days = tree.month_days(months)
+    push, pull, result.conflicts = plan(local_days, remote_days, base)
+    # same change made on both sides
+    result.synced = {day: h for day, h in local_days.items()
+                     if remote_days.get(day) == h and base.get(day) != h}
+
+    for i in range(0, len(push), PUSH_BATCH):
+        batch = push[i:i + PUSH_BATCH]
+        accepted, conflicts = client.push(
+            year, {day: store.day(date_from_str(day)) for day in batch},
+            {day: remote_days.get(day, EMPTY) for day in batch})
+        result.synced.update((day, local_days.get(day, EMPTY)) for day in accepted)
+        result.pushed += len(accepted)
+        result.conflicts.extend(conflicts)
+    if pull:
+        result.pulled = {day: [tuple(a) for a in activities]
+                         for day, activities in client.pull(year, pull).items()}
+        result.replaced = {day: local_days.get(day, EMPTY) for day in pull}
+    return result
+
+
+class SyncState:
+    """
+    Last synced hash of every day, kept in a json file
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._years = {}
+        if os.path.isfile(filename):
+            with open(filename) as f:
+                self._years = json.load(f)
+
+    def base(self, year):
+        return dict(self._years.get(str(year), {}))
+
+    def update(self, year, day_hashes):
+        days = self._years.setdefault(str(year), {})
+        for day, h in day_hashes.items():
+            if h == EMPTY:
+                days.pop(day, None)
+            else:
+                days[day] = h
+
+    def save(self):
+        with atomic_write(self._filename) as f:
+            json.dump(self._years, f, sort_keys=True)
@@ -0,0 +1,129 @@
+"""
+Reference sync server for local and offline testing.
+
+    python syncserver.py --data server-data --port 8765
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import argparse
+import os
+import threading
+import zlib
+from storage import CsvStorage
+from date_util import date_from_str
+from sync import EMPTY, YearTree, day_hash, decode, encode
+
+
+class SyncRepository:
+    """
+    Server side years with cached hash trees
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._stores = {}
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def diff(self, year, months):
+        with self._lock:
+            tree = self._tree(year)
+            months = {int(m): h for m, h in months.items()}
+            differing = tree.diff_months(months)
+            return {'root': tree.root, 'months': differing,
+                    'days': tree.month_days(differing)}
+
+    def pull(self, year, days):
+        with self._lock:
+            store = self._store(year)
+            return {'days': {day: store.day(date_from_str(day)) for day in days}}
+
+    def push(self, year, days, expected):
+        with self._lock:
+            store = self._store(year)
+            accepted, conflicts, changed = [], [], {}
+            for day, activities in sorted(days.items()):
+                current = day_hash(store.day(date_from_str(day)))
+                if current != expected.get(day, EMPTY):
+                    conflicts.append(day)
+                    continue
+                changed[date_from_str(day)] = [tuple(a) for a in activities]
+                accepted.append(day)
+            for day, activities in changed.items():
+                store.set_day(day, activities)
+            if changed:
+                self._storage.save_days(changed)
+                self._trees.pop(year, None)
+            return {'accepted': accepted, 'conflicts': conflicts}
+
+    def _store(self, year):
+        store = self._stores.get(year)
+        if store is None:
+            store = self._stores[year] = self._storage.load_year(year)
+        return store
+
+    def _tree(self, year):
+        tree = self._trees.get(year)
+        if tree is None:
+            tree = self._trees[year] = YearTree.from_store(self._store(year), year)
+        return tree
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        routes = {'/diff': lambda r, p: r.diff(int(p['year']), p['months']),
+                  '/pull': lambda r, p: r.pull(int(p['year']), p['days']),
+                  '/push': lambda r, p: r.push(int(p['year']), p['days'], p['expected'])}
+        route = routes.get(self.path)
+        if route is None:
+            self.send_error(404)
+            return
+        try:
+            payload = decode(self.rfile.read(int(self.headers['Content-Length'])))
+            body = encode(route(self.server.repository, payload))
+        except (AttributeError, KeyError, TypeError, ValueError, zlib.error) as e:
+            # malformed body or fields
+            self.send_error(400, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'deflate')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SyncServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, repository):
+        HTTPServer.__init__(self, address, SyncHandler)
+        self.repository = repository
+
+
+def serve(data_dir, host='127.0.0.1', port=8765):
+    os.makedirs(data_dir, exist_ok=True)
+    storage = CsvStorage(os.path.join(data_dir, 'activities'))
+    return SyncServer((host, port), SyncRepository(storage))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local activity sync server')
+    parser.add_argument('--data', default='sync-data')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+    server = serve(args.data, args.host, args.port)
+    print('serving {} on http://{}:{}'.format(args.data, args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-from tkinter import Frame, Label, StringVar, Entry, Grid
+from contextlib import contextmanager
+from tkinter import Frame, Label, Scrollbar, StringVar, Entry, Grid
+import metrics
 
 
 class CellInput(Entry):
@@ -10,9 +12,10 @@ class CellInput(Entry):
         self._col = col
         self._init_on_click()
 
-    def move_one_row_up(self):
+    def move_one_row_up(self, regrid=True):
         self._row -= 1
-        self.grid()
+        if regrid:
+            self.grid()
         
     def grid(self, **options):
         options['row'] = self._row
@@ -43,6 +46,9 @@ class Table(Frame):
         self._on_change_callback = None
         self._init_header(self._cols)
         self._last_selected = None
+        self._batch_depth = 0
+        self._batch_changed = False
+        self._regrid_pending = False
         # expand last column to fill width
         Grid.columnconfigure(self, len(cols)-1, weight=1)
 
@@ -52,6 +58,7 @@ class Table(Frame):
         options['expand'] = options.get('expand', True)
         super().pack(options)
 
+    @metrics.timed('table.add_row')
     def add_row(self, *values):
         # because header takes 1 row
         new_row_grid_index = len(self._rows) + 1
@@ -68,10 +75,10 @@ class Table(Frame):
                 cell_text.set(values[i])
         Grid.rowconfigure(self, new_row_grid_index, minsize=self._row_height)
         # calls callback with operation-type, value and row index
-        if self._on_change_callback:
-            self._on_change_callback('add', values, new_row_grid_index)
+        self._changed('add', values, new_row_grid_index)
         return new_row
 
+    @metrics.timed('table.delete_row')
     def delete_row(self, row_grid_index):
         if row_grid_index is None:
             return None
@@ -92,17 +99,49 @@ class Table(Frame):
         for i, row in enumerate(self._rows):
             if i >= row_nr:
                 for cell in row:
-                    cell.move_one_row_up()
+                    cell.move_one_row_up(regrid=not self._batch_depth)
+        if self._batch_depth:
+            self._regrid_pending = True
 
         # calls callback with operation-type and removed values in row
-        if self._on_change_callback:
-            self._on_change_callback('delete', tuple(removed_row_values))
+        self._changed('delete', tuple(removed_row_values))
 
         return removed_row_values
 
     def clear_table(self):
-        while len(self._rows):
-            self.delete_row(1)
+        self.replace_rows(())
+
+    @contextmanager
+    def batch(self):
+        """
+        groups mutations, the grid is updated once at the end and
+        change callback is called once with ('replace', exported rows)
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._end_batch()
+
+    @metrics.timed('table.replace_rows')
+    def replace_rows(self, list_of_tuples):
+        """
+        replaces all rows reusing existing cells
+        """
+        rows = list(list_of_tuples)
+        with self.batch():
+            for row in self._rows[len(rows):]:
+                for cell in row:
+                    cell.destroy()
+            del self._rows[len(rows):]
+            for row, values in zip(self._rows, rows):
+                for i, cell in enumerate(row):
+                    cell.set_text(values[i] if i < len(values) else '')
+            for values in rows[len(self._rows):]:
+                self.add_row(*values)
+            self._batch_changed = True
 
     def select_row(self, row_nr):
         self._last_selected = row_nr
@@ -117,8 +156,9 @@ class Table(Frame):
         return output
 
     def load(self, list_of_tuples):
-        for values in list_of_tuples:
-            self.add_row(*values)
+        with self.batch():
+            for values in list_of_tuples:
+                self.add_row(*values)
 
     def size(self):
         return len(self._rows)
@@ -136,6 +176,26 @@ class Table(Frame):
     def reset_selected(self):
         self._last_selected = None
 
+    def _changed(self, *args):
+        if self._batch_depth:
+            self._batch_changed = True
+        elif self._on_change_callback:
+            self._on_change_callback(*args)
+
+    def _end_batch(self):
+        if self._regrid_pending:
+            self._regrid_pending = False
+            self._regrid()
+        if self._batch_changed:
+            self._batch_changed = False
+            if self._on_change_callback:
+                self._on_change_callback('replace', self.export())
+
+    def _regrid(self):
+        for row in self._rows:
+            for cell in row:
+                cell.grid()
+
     def _init_header(self, cols):
         for i, col in enumerate(cols):
             label = Label(self, text=col.get('label', 'Label'.join(str(i))),
@@ -143,3 +203,156 @@ class Table(Frame):
             label.grid(row=0, column=i, sticky='snwe', ipadx=15)
         # retuns last col
         return col
+
+
+class VirtualTable(Table):
+    """
+    Table backed by a list of rows where only a fixed pool of cell widgets,
+    sized to the viewport, is created. Scrolling rebinds the pool to other
+    rows of the model, row indices are model indices starting from 1.
+    """
+
+    def __init__(self, parent=None, cols=None, row_height=22, visible_rows=10):
+        Table.__init__(self, parent, cols, row_height)
+        self._data = []
+        self._offset = 0
+        self._rebinding = False
+        self._pool = []
+        self._scrollbar = Scrollbar(self, orient='vertical', command=self._on_scroll)
+        self._scrollbar.grid(row=1, column=len(cols), rowspan=visible_rows, sticky='ns')
+        self.resize_pool(visible_rows)
+        self.bind('<Configure>', self._on_configure)
+
+    @metrics.timed('table.add_row')
+    def add_row(self, *values):
+        row = [str(values[i]) if i < len(values) else '' for i in range(len(self._cols))]
+        self._data.append(row)
+        self._request_rebind()
+        self._changed('add', values, len(self._data))
+        return row
+
+    @metrics.timed('table.delete_row')
+    def delete_row(self, row_grid_index):
+        if row_grid_index is None:
+            return None
+        row_nr = row_grid_index - 1
+        if row_nr >= len(self._data) or row_nr < 0:
+            return None
+        removed_row_values = self._data.pop(row_nr)
+        self._request_rebind()
+        self._changed('delete', tuple(removed_row_values))
+        return removed_row_values
+
+    @metrics.timed('table.replace_rows')
+    def replace_rows(self, list_of_tuples):
+        with self.batch():
+            self._data = [[str(values[i]) if i < len(values) else ''
+                           for i in range(len(self._cols))]
+                          for values in list_of_tuples]
+            self._offset = 0
+            self._request_rebind()
+            self._batch_changed = True
+
+    def select_row(self, row_nr):
+        # cells report their grid row, selection is kept as model row
+        super().select_row(self._offset + row_nr)
+
+    def export(self):
+        return [tuple(row) for row in self._data]
+
+    def size(self):
+        return len(self._data)
+
+    def scroll_to(self, row_nr):
+        """
+        makes model row (starting from 1) the first visible row
+        """
+        self._offset = max(0, min(row_nr - 1, len(self._data) - len(self._pool)))
+        self._rebind()
+
+    def resize_pool(self, visible_rows):
+        visible_rows = max(1, visible_rows)
+        while len(self._pool) < visible_rows:
+            self._pool.append(self._create_pool_row(len(self._pool) + 1))
+        for i, row in enumerate(self._pool):
+            for cell, _ in row:
+                if i >= visible_rows:
+                    cell.grid_remove()
+        self._visible_rows = visible_rows
+        self._scrollbar.grid(rowspan=visible_rows)
+        self._rebind()
+
+    # private
+    def _create_pool_row(self, row_grid_index):
+        row = []
+        for i, col in enumerate(self._cols):
+            cell_text = StringVar()
+            cell = CellInput(self, row=row_grid_index, col=i,
+                             textvariable=cell_text, justify=col.get('justify'))
+            cell_text.trace_add('write', self._writer(row_grid_index - 1, i, cell_text))
+            for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+                cell.bind(sequence, self._on_wheel)
+            row.append((cell, cell_text))
+        Grid.rowconfigure(self, row_grid_index, minsize=self._row_height)
+        return row
+
+    def _writer(self, pool_row, col, cell_text):
+        def write_back(*_):
+            if self._rebinding:
+                return
+            data_row = self._offset + pool_row
+            if data_row < len(self._data):
+                self._data[data_row][col] = cell_text.get()
+        return write_back
+
+    def _request_rebind(self):
+        if self._batch_depth:
+            self._regrid_pending = True
+        else:
+            self._rebind()
+
+    def _regrid(self):
+        self._rebind()
+
+    @metrics.timed('table.rebind')
+    def _rebind(self):
+        self._offset = max(0, min(self._offset, len(self._data) - self._visible_rows))
+        self._rebinding = True
+        try:
+            for i, row in enumerate(self._pool[:self._visible_rows]):
+                data_row = self._offset + i
+                for c, (cell, cell_text) in enumerate(row):
+                    if data_row < len(self._data):
+                        cell_text.set(self._data[data_row][c])
+                        cell.grid()
+                    else:
+                        cell.grid_remove()
+        finally:
+            self._rebinding = False
+        if self._data:
+            first = self._offset / len(self._data)
+            last = min(1.0, (self._offset + self._visible_rows) / len(self._data))
+            self._scrollbar.set(first, last)
+        else:
+            self._scrollbar.set(0.0, 1.0)
+
+    def _on_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            self._offset = int(float(amount) * len(self._data))
+        elif action == 'scroll':
+            step = self._visible_rows if unit == 'pages' else 1
+            self._offset += int(amount) * step
+        self._rebind()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._offset -= 1
+        else:
+            self._offset += 1
+        self._rebind()
+
+    def _on_configure(self, event):
+        # header takes one row
+        visible_rows = event.height // self._row_height - 1
+        if visible_rows != self._visible_rows:
+            self.resize_pool(visible_rows)
@@ -0,0 +1,50 @@
+from importer import import_files, parse_file
+from storage import CsvStorage
+from tracks import TrackStore, track_id
+
+GPX = '''<?xml version="1.0"?>
+<gpx xmlns="http://www.topografix.com/GPX/1/1">
+<metadata><time>2018-06-07T06:00:00Z</time></metadata>
+<trk><type>running</type><trkseg>
+<trkpt lat="52.0" lon="21.0"><time>{start}</time></trkpt>
+<trkpt lat="52.01" lon="21.0"><time>{end}</time></trkpt>
+</trkseg></trk></gpx>'''
+
+
+def write_gpx(path, start='2018-06-07T08:00:00Z', end='2018-06-07T08:30:00Z'):
+    path.write(GPX.format(start=start, end=end), ensure=True)
+    return str(path)
+
+
+def test_duration_starts_at_first_point(tmpdir):
+    workout = parse_file(write_gpx(tmpdir.join('a.gpx')))
+    assert workout.seconds == 1800
+    assert round(workout.distance_km, 2) == 1.11
+
+
+def test_day_long_workout_is_reported(tmpdir):
+    filename = write_gpx(tmpdir.join('a.gpx'), end='2018-06-08T08:00:00Z')
+    assert parse_file(filename) == filename + ': longer than 23:59'
+
+
+def recording(filename):
+    workout = parse_file(filename)
+    return workout.start.date(), track_id(workout.start, workout.seconds)
+
+
+def test_same_recording_is_imported_once(tmpdir):
+    storage = CsvStorage(str(tmpdir.join('activities')))
+    tracks = TrackStore(str(tmpdir.join('tracks')))
+    files = [write_gpx(tmpdir.join('g', 'a.gpx')),
+             write_gpx(tmpdir.join('g', 'sub', 'a.gpx'))]
+    assert import_files(storage, files, {}, workers=1, tracks=tracks) == (1, [])
+    assert import_files(storage, files[:1], {}, workers=1, tracks=tracks) == (0, [])
+    # another recording with the same file name
+    other = write_gpx(tmpdir.join('h', 'a.gpx'), start='2018-06-07T09:00:00Z',
+                      end='2018-06-07T09:20:00Z')
+    assert import_files(storage, [other], {}, workers=1, tracks=tracks) == (1, [])
+    day, first = recording(files[0])
+    second = recording(other)[1]
+    descriptions = [a[4] for a in storage.read_year(day.year).day(day)]
+    assert descriptions == ['a.gpx ' + first, 'a.gpx ' + second]
+    assert tracks.ids(day) == {first, second}
@@ -0,0 +1,47 @@
+from datetime import date
+from journal import Journal
+
+DAY1, DAY2, DAY3 = date(2018, 1, 1), date(2018, 1, 2), date(2018, 1, 3)
+
+
+def make_journal(tmpdir):
+    csv_file = tmpdir.join('activities_2018.csv')
+    csv_file.write('2018-01-01|run|1:00|10|3|\n')
+    return Journal(str(csv_file))
+
+
+def test_entries_replace_days(tmpdir):
+    journal = make_journal(tmpdir)
+    journal.append(DAY2, [('bike', '2:00', '50', '2', 'one')])
+    journal.append_days({DAY2: [('bike', '1:00', '25', '2', 'two')], DAY1: []})
+    store = journal.load()
+    assert store.dates() == [DAY2]
+    assert store.day(DAY2) == [('bike', '1:00', '25', '2', 'two')]
+
+
+def test_append_after_torn_entry(tmpdir):
+    journal = make_journal(tmpdir)
+    journal.append(DAY2, [('bike', '2:00', '50', '2', '')])
+    with open(journal.filename, 'ab') as f:
+        f.write(journal._entry(DAY2, [('swim', '0:30', '1', '1', '')])[:-3])
+    journal.append(DAY3, [('run', '0:45', '8', '3', '')])
+    assert journal.load().dates() == [DAY1, DAY2, DAY3]
+    assert journal.load().day(DAY2) == [('bike', '2:00', '50', '2', '')]
+    journal.compact().join()
+    assert journal.size() == 0
+    assert journal.load().dates() == [DAY1, DAY2, DAY3]
+
+
+def test_compaction_drops_torn_entry_and_keeps_later_appends(tmpdir):
+    journal = make_journal(tmpdir)
+    journal.append(DAY2, [('bike', '2:00', '50', '2', '')])
+    with open(journal.filename, 'ab') as f:
+        f.write(b'!2018-01-03|99|0\ntorn')
+    text, data = journal._read_files()
+    journal.append(DAY3, [('run', '0:45', '8', '3', '')])
+    # the compaction read the files before the append
+    journal._read_files = lambda: (text, data)
+    journal._compact()
+    del journal._read_files
+    assert journal.load().dates() == [DAY1, DAY2, DAY3]
+    assert [day for day, _ in journal.entries()] == [DAY3]
@@ -0,0 +1,27 @@
+from datetime import date
+import io
+from journal import Journal
+from model import ActivityStore
+
+LEGACY = '2018-01-01|run|1:30:00|10 km|hard|legacy\n2018-01-02|bike|1:00|20|3|\n'
+
+
+def test_unconverted_rows_keep_their_text():
+    store = ActivityStore.read_csv(io.StringIO(LEGACY))
+    assert store.raw_dates() == [date(2018, 1, 1)]
+    assert store.day(date(2018, 1, 1)) == [('run', '1:30:00', '10 km', 'hard', 'legacy')]
+    assert store.day_minutes(date(2018, 1, 1)) == 0
+    store.set_day(date(2018, 1, 2), [('bike', '2:00', '30', '2', 'new')])
+    out = io.StringIO()
+    store.copy().write_csv(out)
+    assert out.getvalue().splitlines() == ['2018-01-01|run|1:30:00|10 km|hard|legacy',
+                                           '2018-01-02|bike|2:00|30|2|new']
+
+
+def test_compaction_keeps_unconverted_rows(tmpdir):
+    csv_file = tmpdir.join('activities_2018.csv')
+    csv_file.write(LEGACY)
+    journal = Journal(str(csv_file))
+    journal.append(date(2018, 1, 2), [('bike', '2:00', '30', '2', '')])
+    journal.compact().join()
+    assert csv_file.read().splitlines()[0] == '2018-01-01|run|1:30:00|10 km|hard|legacy'
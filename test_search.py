@@ -0,0 +1,61 @@
+from datetime import date
+import pytest
+from search import SearchIndex, parse_query
+from storage import CsvStorage, SqliteStorage
+
+
+@pytest.mark.parametrize('text', ['', 'run -', 'run NOT', '-', 'NOT', '(run', 'run )',
+                                  '()'])
+def test_parse_rejects_incomplete_queries(text):
+    with pytest.raises(ValueError):
+        parse_query(text)
+
+
+def test_parse_query_tree():
+    assert parse_query('run -easy') == (
+        'and', [('term', 'run'), ('not', ('term', 'easy'))])
+    assert parse_query('Hill* OR track') == (
+        'or', [('prefix', 'hill'), ('term', 'track')])
+
+
+def make_index(tmpdir):
+    index = SearchIndex(str(tmpdir.join('index.json')))
+    index.update_day(date(2019, 3, 1), [('run', '1:00', '10', '3', 'hill repeats')])
+    index.update_day(date(2019, 3, 2), [('bike', '2:00', '50', '2', 'easy')])
+    index.update_day(date(2020, 1, 5), [('run', '0:30', '5', '1', 'easy track')])
+    return index
+
+
+def test_search(tmpdir):
+    index = make_index(tmpdir)
+    assert index.search('run') == [date(2019, 3, 1), date(2020, 1, 5)]
+    assert index.search('run -easy') == [date(2019, 3, 1)]
+    assert index.search('sport:bike OR hil*') == [date(2019, 3, 1), date(2019, 3, 2)]
+    assert index.search('NOT run') == [date(2019, 3, 2)]
+
+
+def test_saved_csv_years_are_not_reindexed(tmpdir):
+    storage = CsvStorage(str(tmpdir.join('activities')))
+    day = date(2019, 3, 1)
+    storage.save_days({day: [('run', '1:00', '10', '3', 'hill')]})
+    index = make_index(tmpdir)
+    assert index.refresh(storage) == [2019]
+    storage.save_days({day: [('run', '1:00', '10', '3', 'track')]})
+    index.update_day(day, [('run', '1:00', '10', '3', 'track')])
+    index.mark_saved(storage, {2019})
+    assert index.refresh(storage) == []
+
+
+def test_saved_sqlite_years_are_not_reindexed(tmpdir):
+    storage = SqliteStorage(str(tmpdir.join('activities.db')))
+    try:
+        storage.save_days({date(2019, 3, 1): [('run', '1:00', '10', '3', 'hill')],
+                           date(2020, 1, 5): [('run', '0:30', '5', '1', 'easy')]})
+        index = make_index(tmpdir)
+        assert index.refresh(storage) == [2019, 2020]
+        storage.save_days({date(2019, 3, 2): [('bike', '2:00', '50', '2', '')]})
+        index.update_day(date(2019, 3, 2), [('bike', '2:00', '50', '2', '')])
+        index.mark_saved(storage, {2019})
+        assert index.refresh(storage) == []
+    finally:
+        storage.close()
@@ -0,0 +1,29 @@
+from datetime import date
+from storage import CsvStorage, SqliteStorage, migrate
+
+DAY = date(2018, 5, 18)
+
+
+def test_sqlite_save_replaces_day(tmpdir):
+    storage = SqliteStorage(str(tmpdir.join('activities.db')))
+    try:
+        storage.save_day(DAY, [('bike', '2:00', '55', '3', ''),
+                               ('run', '0:30', '5', '2', '')])
+        storage.save_day(DAY, [('swim', '1:00', '2', '1', 'pool')])
+        assert storage.load_year(2018).day(DAY) == [('swim', '1:00', '2', '1', 'pool')]
+    finally:
+        storage.close()
+
+
+def test_migrate_includes_journal_only_years(tmpdir):
+    prefix = str(tmpdir.join('activities'))
+    csv_storage = CsvStorage(prefix)
+    csv_storage.save_day(DAY, [('bike', '2:00', '55', '3', '')])
+    csv_storage.close()
+    migrate(prefix, str(tmpdir.join('activities.db')))
+    db = SqliteStorage(str(tmpdir.join('activities.db')))
+    try:
+        assert db.years() == [2018]
+        assert db.load_year(2018).day(DAY) == [('bike', '2:00', '55', '3', '')]
+    finally:
+        db.close()
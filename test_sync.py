@@ -0,0 +1,52 @@
+from datetime import date
+import threading
+import pytest
+from model import ActivityStore
+from sync import EMPTY, SyncClient, day_hash, plan, sync_year
+from syncserver import serve
+
+DAY1, DAY2 = date(2018, 5, 18), date(2018, 6, 1)
+BIKE = [('bike', '2:00', '55', '3', '')]
+RUN = [('run', '0:45', '8', '3', 'hills')]
+
+
+def test_plan():
+    local = {'a': 'x', 'b': 'new', 'c': 'mine', 'd': 'same'}
+    remote = {'a': 'x', 'b': 'old', 'c': 'theirs', 'd': 'same', 'e': 'added'}
+    base = {'b': 'old', 'c': 'old'}
+    assert plan(local, remote, base) == (['b'], ['e'], ['c'])
+    assert day_hash([]) == EMPTY
+
+
+@pytest.fixture
+def client(tmpdir):
+    server = serve(str(tmpdir.join('server')), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield SyncClient('http://127.0.0.1:{}'.format(server.server_address[1]))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def store_of(days):
+    store = ActivityStore()
+    for day, activities in sorted(days.items()):
+        store.set_day(day, activities)
+    return store
+
+
+def test_sync_year_pushes_and_pulls(client):
+    first = sync_year(client, store_of({DAY1: BIKE}), 2018, {})
+    assert first.pushed == 1 and not first.conflicts
+    # another machine gets the pushed day and adds one
+    second = sync_year(client, store_of({}), 2018, {})
+    assert second.pulled == {str(DAY1): BIKE}
+    third = sync_year(client, store_of({DAY1: BIKE, DAY2: RUN}), 2018,
+                      {str(DAY1): day_hash(BIKE)})
+    assert third.pushed == 1
+    # a day changed on both sides since the last sync is a conflict
+    fourth = sync_year(client, store_of({DAY1: RUN, DAY2: RUN}), 2018, {})
+    assert fourth.conflicts == [str(DAY1)]
+    assert not fourth.pulled and fourth.pushed == 0
@@ -0,0 +1,59 @@
+import pytest
+
+COLS = [{'label': name} for name in ('Sport', 'Duration', 'Distance',
+                                     'Intensity', 'Description')]
+
+
+@pytest.fixture(scope='module')
+def VirtualTable(fake_tk):
+    return fake_tk('table').VirtualTable
+
+
+def make_table(VirtualTable, rows=20, visible_rows=5):
+    table = VirtualTable(None, COLS, visible_rows=visible_rows)
+    table.replace_rows([('run', '1:00', str(i), '3', 'row {}'.format(i))
+                        for i in range(rows)])
+    return table
+
+
+def shown(table):
+    return [var.get() for var in (row[2][1] for row in table._pool)]
+
+
+def test_pool_is_sized_to_viewport(VirtualTable):
+    table = make_table(VirtualTable, rows=1000)
+    assert len(table._pool) == 5
+    assert shown(table) == ['0', '1', '2', '3', '4']
+
+
+def test_scroll_rebinds_pool(VirtualTable):
+    table = make_table(VirtualTable)
+    table.scroll_to(11)
+    assert shown(table) == ['10', '11', '12', '13', '14']
+    assert table._scrollbar.position == (0.5, 0.75)
+    table._on_scroll('scroll', 1, 'pages')
+    assert shown(table) == ['15', '16', '17', '18', '19']
+    # past the end the last page stays shown
+    table._on_scroll('scroll', 1, 'pages')
+    assert shown(table) == ['15', '16', '17', '18', '19']
+    table._on_scroll('moveto', '0')
+    assert shown(table) == ['0', '1', '2', '3', '4']
+
+
+def test_edit_writes_back_to_shown_row(VirtualTable):
+    table = make_table(VirtualTable)
+    table.scroll_to(8)
+    table._pool[1][4][1].set('edited')
+    exported = table.export()
+    assert exported[8][4] == 'edited'
+    # rebinding the pool does not write old cell texts to the new rows
+    table.scroll_to(1)
+    assert table.export() == exported
+
+
+def test_delete_row_rebinds(VirtualTable):
+    table = make_table(VirtualTable, rows=6)
+    table.scroll_to(2)
+    assert table.delete_row(2)[2] == '1'
+    assert table.size() == 5
+    assert shown(table) == ['0', '2', '3', '4', '5']
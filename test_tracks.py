@@ -0,0 +1,32 @@
+from datetime import date, datetime
+from tracks import Track, TrackStore, description_track_id, track_id
+
+DAY = date(2018, 6, 7)
+
+
+def test_track_id_ends_the_description():
+    tid = track_id(datetime(2018, 6, 7, 8, 0, 15), 1800.4)
+    assert tid == '080015-1800'
+    assert description_track_id('a.gpx ' + tid) == tid
+    assert description_track_id(tid) == tid
+    assert description_track_id('a.gpx') is None
+    assert description_track_id('x080015-1800') is None
+
+
+def test_encode_round_trip():
+    track = Track.from_points([5200000, 5200100, 5200200], [2100000, 2100000, 2100300])
+    decoded = Track.decode(track.encode())
+    assert [list(level[1]) for level in decoded.levels] == \
+        [list(level[1]) for level in track.levels]
+    assert list(decoded.levels[0][2]) == [2100000, 2100000, 2100300]
+
+
+def test_store_lists_saved_tracks(tmpdir):
+    tracks = TrackStore(str(tmpdir))
+    assert tracks.ids(DAY) == set()
+    data = Track.from_points([5200000, 5201000], [2100000, 2100000]).encode()
+    tracks.save(DAY, '080000-1800', data)
+    assert tracks.ids(DAY) == {'080000-1800'}
+    assert TrackStore(str(tmpdir)).ids(DAY) == {'080000-1800'}
+    assert tracks.thumbnail(DAY, '080000-1800').startswith(b'\x89PNG')
+    assert tracks.thumbnail(DAY, '090000-60') is None
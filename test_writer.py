@@ -0,0 +1,52 @@
+from datetime import date
+from writer import BackgroundWriter
+
+DAY1, DAY2 = date(2018, 5, 18), date(2018, 5, 19)
+
+
+class Storage:
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.days = {}
+
+    def save_days(self, activities_by_date):
+        if self.fail:
+            raise OSError('disk full')
+        self.days.update(activities_by_date)
+
+
+def test_saves_are_written():
+    storage = Storage()
+    writer = BackgroundWriter(storage)
+    writer.save_day(DAY1, [('bike', '2:00', '55', '3', '')])
+    writer.save_day(DAY2, [])
+    assert writer.flush(5)
+    writer.close()
+    assert storage.days == {DAY1: [('bike', '2:00', '55', '3', '')], DAY2: []}
+
+
+def test_failed_days_stay_unsaved_until_retried():
+    storage = Storage(fail=True)
+    writer = BackgroundWriter(storage)
+    writer.save_day(DAY1, [('bike', '2:00', '55', '3', '')])
+    writer.flush(5)
+    assert writer.unsaved() == 1
+    assert [type(error) for _, error in writer.results()] == [OSError]
+    writer.retry()
+    writer.flush(5)
+    assert writer.unsaved() == 1
+    storage.fail = False
+    writer.retry()
+    writer.flush(5)
+    assert writer.unsaved() == 0
+    assert list(storage.days) == [DAY1]
+    writer.close()
+
+
+def test_close_reports_days_it_could_not_write():
+    storage = Storage(fail=True)
+    writer = BackgroundWriter(storage)
+    writer.save_day(DAY1, [])
+    writer.close()
+    assert writer.unsaved() == 1
@@ -0,0 +1,52 @@
+import metrics
+
+
+class TileTextMixin:
+    """
+    Text over one tile of a grid canvas, shared by the grid backends.
+    The grid sets self._calgrid, calls _init_tile_text() and returns
+    the top left corner of a tile from _tile_origin(tile_id).
+    """
+
+    def set_text_to_tile(self, tile_id, text, offset_x=10, offset_y=8):
+        if (tile_id, text) == self._text_shown:
+            return
+        x0, y0 = self._tile_origin(tile_id)
+        pos = x0 + offset_x, y0 + offset_y
+        if self._text is None:
+            # disable state required to disable catching events
+            self._text = self._calgrid.create_text(pos, text=text, state='disabled')
+        else:
+            self._calgrid.coords(self._text, pos)
+            self._calgrid.itemconfig(self._text, text=text, state='disabled')
+        self._text_shown = (tile_id, text)
+
+    def remove_text(self):
+        self._hover = None
+        if self._text and self._text_shown:
+            self._calgrid.itemconfig(self._text, state='hidden')
+        self._text_shown = None
+
+    def hover(self, tile_id, text):
+        """
+        shows text on tile when idle, only the latest of quickly
+        following calls is drawn
+        """
+        self._hover = (tile_id, text)
+        if self._hover_job is None:
+            self._hover_job = self.after_idle(self._draw_hover)
+
+    # private
+    def _init_tile_text(self):
+        self._text = None
+        # (tile_id, text) waiting to be drawn by after_idle
+        self._hover = None
+        self._hover_job = None
+        self._text_shown = None
+
+    @metrics.timed('grid.draw_hover')
+    def _draw_hover(self):
+        self._hover_job = None
+        if self._hover:
+            self.set_text_to_tile(*self._hover)
+            self._hover = None
@@ -11,3 +11,33 @@ def timedelta_from_hh_mm(activity_duration):
 
 def timedelta_to_hh_mm(td):
     return ':'.join(str(td).split(':')[:2])
+
+
+def parse_hh_mm(activity_duration):
+    """
+    returns whole minutes of a H:MM duration as int, None if it is not one
+    """
+    parts = activity_duration.strip().split(':')
+    if len(parts) != 2:
+        return None
+    hh, mm = parts
+    # isdecimal, not isdigit, int() rejects digits like '²'
+    if not (0 < len(hh) <= 2 and 0 < len(mm) <= 2 and hh.isdecimal() and mm.isdecimal()):
+        return None
+    hours, minutes = int(hh), int(mm)
+    if hours > 23 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def minutes_from_hh_mm(activity_duration):
+    """
+    same as timedelta_from_hh_mm but returns whole minutes as int,
+    without going through strptime
+    """
+    minutes = parse_hh_mm(activity_duration)
+    return 0 if minutes is None else minutes
+
+
+def minutes_to_hh_mm(minutes):
+    return '{}:{:02d}'.format(minutes // 60, minutes % 60)
@@ -0,0 +1,311 @@
+"""
+GPS tracks of activities, kept beside the activity files:
+
+    <path>/<year>/<date>_<id>.trk       track with simplification levels
+    <path>/<year>/<date>_<id>_<n>.png   cached n x n route thumbnail
+
+id is the recording's local start time and duration (083015-3600), it
+ends the description of the imported activity so the track follows the
+activity whatever its position in the day. Coordinates are
+1e-5 degree integers (about a meter), stored as zigzag varint deltas.
+Each file holds the raw track and Douglas-Peucker simplifications of it,
+a preview uses the coarsest level still finer than its pixels.
+"""
+from array import array
+from collections import OrderedDict
+import io
+import math
+import os
+import re
+import threading
+from file_util import atomic_write
+
+SCALE = 100000
+MAGIC = b'GTRK1'
+# simplification tolerances in meters, 0 is the raw track
+LEVELS_M = (0, 5, 25, 100)
+EARTH_RADIUS_M = 6371008.8
+THUMBNAIL_SIZE = 120
+THUMBNAIL_BG = (242, 242, 242)
+THUMBNAIL_LINE = (219, 106, 0)
+_TRACK_ID = re.compile(r'(?:^|\s)(\d{6}-\d+)$')
+_TRACK_FILE = re.compile(r'(\d{4}-\d\d-\d\d)_(\d{6}-\d+)\.trk$')
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def project(lats, lons):
+    """
+    returns x, y meters of scaled coordinates, equirectangular around mid latitude
+    """
+    if not lats:
+        return [], []
+    mid = math.radians((min(lats) + max(lats)) / 2 / SCALE)
+    k = math.radians(1 / SCALE) * EARTH_RADIUS_M
+    return [lon * k * math.cos(mid) for lon in lons], [lat * k for lat in lats]
+
+
+def simplify(xs, ys, epsilon):
+    """
+    returns indices of points kept by Douglas-Peucker with tolerance epsilon,
+    iterative so long tracks do not hit the recursion limit
+    """
+    n = len(xs)
+    if n < 3 or epsilon <= 0:
+        return list(range(n))
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        x0, y0, x1, y1 = xs[first], ys[first], xs[last], ys[last]
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        farthest, max_dist = None, epsilon
+        for i in range(first + 1, last):
+            if length:
+                dist = abs(dy * xs[i] - dx * ys[i] + x1 * y0 - y1 * x0) / length
+            else:
+                dist = math.hypot(xs[i] - x0, ys[i] - y0)
+            if dist > max_dist:
+                farthest, max_dist = i, dist
+        if farthest is not None:
+            keep[farthest] = 1
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [i for i in range(n) if keep[i]]
+
+
+class Track:
+    """
+    Levels of one track, each (tolerance m, lats, lons) with scaled int
+    coordinates, finest level first
+    """
+
+    def __init__(self, levels):
+        self.levels = levels
+
+    @classmethod
+    def from_points(cls, lats, lons, levels_m=LEVELS_M):
+        lats, lons = array('l', lats), array('l', lons)
+        xs, ys = project(lats, lons)
+        levels = []
+        for epsilon in levels_m:
+            kept = simplify(xs, ys, epsilon)
+            levels.append((epsilon, array('l', (lats[i] for i in kept)),
+                           array('l', (lons[i] for i in kept))))
+        return cls(levels)
+
+    def level(self, max_error_m):
+        """
+        returns (lats, lons) of the coarsest level within max_error_m
+        """
+        best = self.levels[0]
+        for level in self.levels:
+            if level[0] <= max_error_m:
+                best = level
+        return best[1], best[2]
+
+    def encode(self):
+        out = bytearray(MAGIC)
+        write_varint(out, len(self.levels))
+        for epsilon, lats, lons in self.levels:
+            write_varint(out, epsilon)
+            write_varint(out, len(lats))
+            last_lat = last_lon = 0
+            for lat, lon in zip(lats, lons):
+                write_varint(out, zigzag(lat - last_lat))
+                write_varint(out, zigzag(lon - last_lon))
+                last_lat, last_lon = lat, lon
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        if not data.startswith(MAGIC):
+            raise ValueError('not a track file')
+        count, pos = read_varint(data, len(MAGIC))
+        levels = []
+        for _ in range(count):
+            epsilon, pos = read_varint(data, pos)
+            n, pos = read_varint(data, pos)
+            lats, lons = array('l'), array('l')
+            lat = lon = 0
+            for _ in range(n):
+                delta, pos = read_varint(data, pos)
+                lat += unzigzag(delta)
+                delta, pos = read_varint(data, pos)
+                lon += unzigzag(delta)
+                lats.append(lat)
+                lons.append(lon)
+            levels.append((epsilon, lats, lons))
+        return cls(levels)
+
+
+def render_thumbnail(track, size=THUMBNAIL_SIZE, margin=6):
+    """
+    returns png bytes of the route fitted into a size x size square
+    """
+    from heatmap import write_png
+    xs, ys = project(*track.levels[0][1:])
+    span = max(max(xs) - min(xs), max(ys) - min(ys), 1.0) if xs else 1.0
+    meters_per_pixel = span / (size - 2 * margin)
+    lats, lons = track.level(meters_per_pixel)
+    xs, ys = project(lats, lons)
+    pixels = bytearray(bytes(THUMBNAIL_BG) * (size * size))
+    if xs:
+        min_x, max_y = min(xs), max(ys)
+        # centers the route in the square
+        off_x = margin + ((size - 2 * margin) - (max(xs) - min_x) / meters_per_pixel) / 2
+        off_y = margin + ((size - 2 * margin) - (max_y - min(ys)) / meters_per_pixel) / 2
+        points = [(int(off_x + (x - min_x) / meters_per_pixel),
+                   int(off_y + (max_y - y) / meters_per_pixel)) for x, y in zip(xs, ys)]
+        line = bytes(THUMBNAIL_LINE)
+        for (xa, ya), (xb, yb) in zip(points, points[1:] or points):
+            steps = max(abs(xb - xa), abs(yb - ya), 1)
+            for s in range(steps + 1):
+                x = xa + (xb - xa) * s // steps
+                y = ya + (yb - ya) * s // steps
+                if 0 <= x < size and 0 <= y < size:
+                    start = (y * size + x) * 3
+                    pixels[start:start + 3] = line
+    png = io.BytesIO()
+    write_png(png, size, size, pixels)
+    return png.getvalue()
+
+
+def track_id(start, seconds):
+    """
+    returns id of a recording from its local start datetime and duration,
+    the same recording gets the same id whatever its filename
+    """
+    return '{:%H%M%S}-{}'.format(start, int(round(seconds)))
+
+
+def description_track_id(description):
+    """
+    returns track id at the end of an activity description, None without
+    """
+    match = _TRACK_ID.search(description)
+    return match.group(1) if match else None
+
+
+class TrackStore:
+    """
+    Track files by date and track id with a small memory cache
+    of thumbnails on top of the png files
+    """
+    CACHE_SIZE = 64
+
+    def __init__(self, path='tracks'):
+        self._path = path
+        self._thumbnails = OrderedDict()
+        # {year: {date str: set of track ids}} listed once per year
+        self._years = {}
+        self._lock = threading.Lock()
+
+    def filename(self, day, track_id):
+        return os.path.join(self._path, str(day.year), '{}_{}.trk'.format(day, track_id))
+
+    def save(self, day, track_id, data):
+        """
+        stores encoded track data (Track.encode()) of the recording track_id of day
+        """
+        filename = self.filename(day, track_id)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with atomic_write(filename, 'wb') as f:
+            f.write(data)
+        self._drop_thumbnails(day, track_id)
+        with self._lock:
+            days = self._years.get(day.year)
+            if days is not None:
+                days.setdefault(str(day), set()).add(track_id)
+
+    def load(self, day, track_id):
+        try:
+            with open(self.filename(day, track_id), 'rb') as f:
+                return Track.decode(f.read())
+        except FileNotFoundError:
+            return None
+
+    def ids(self, day):
+        """
+        returns ids of the tracks stored for day
+        """
+        with self._lock:
+            days = self._years.get(day.year)
+        if days is None:
+            days = {}
+            directory = os.path.join(self._path, str(day.year))
+            names = os.listdir(directory) if os.path.isdir(directory) else ()
+            for match in map(_TRACK_FILE.match, names):
+                if match:
+                    days.setdefault(match.group(1), set()).add(match.group(2))
+            with self._lock:
+                days = self._years.setdefault(day.year, days)
+        return set(days.get(str(day), ()))
+
+    def thumbnail(self, day, track_id, size=THUMBNAIL_SIZE):
+        """
+        returns png bytes of the route preview, None without a track
+        """
+        key = (day, track_id, size)
+        with self._lock:
+            png = self._thumbnails.get(key)
+            if png is not None:
+                self._thumbnails.move_to_end(key)
+                return png
+        filename = self._thumbnail_filename(day, track_id, size)
+        if os.path.isfile(filename):
+            with open(filename, 'rb') as f:
+                png = f.read()
+        else:
+            track = self.load(day, track_id)
+            if track is None:
+                return None
+            png = render_thumbnail(track, size)
+            with atomic_write(filename, 'wb') as f:
+                f.write(png)
+        with self._lock:
+            self._thumbnails[key] = png
+            while len(self._thumbnails) > TrackStore.CACHE_SIZE:
+                self._thumbnails.popitem(last=False)
+        return png
+
+    # private
+    def _thumbnail_filename(self, day, track_id, size):
+        return os.path.join(self._path, str(day.year),
+                            '{}_{}_{}.png'.format(day, track_id, size))
+
+    def _drop_thumbnails(self, day, track_id):
+        with self._lock:
+            for key in [k for k in self._thumbnails if k[:2] == (day, track_id)]:
+                del self._thumbnails[key]
+        directory = os.path.dirname(self.filename(day, track_id))
+        prefix = '{}_{}_'.format(day, track_id)
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith('.png'):
+                os.unlink(os.path.join(directory, name))
@@ -0,0 +1,101 @@
+import queue
+import threading
+
+
+class BackgroundWriter:
+    """
+    Saves days to storage on a dedicated thread. Days saved while the
+    thread is busy are merged and written with one save_days() call,
+    a later save of the same day replaces the earlier one.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._pending = {}
+        # days of a failed write, retried with the next write or on close
+        self._failed = {}
+        self._busy = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='writer', daemon=True)
+        self._thread.start()
+
+    def save_day(self, day, activities):
+        with self._cond:
+            self._pending[day] = list(activities)
+            self._cond.notify_all()
+
+    def busy(self):
+        with self._cond:
+            return self._busy or bool(self._pending)
+
+    def unsaved(self):
+        """
+        returns number of days whose write failed and is not yet retried
+        """
+        with self._cond:
+            return len(self._failed)
+
+    def results(self):
+        """
+        returns list of (saved days count, exception or None) of writes
+        finished since the last call
+        """
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def flush(self, timeout=None):
+        """
+        waits until all saved days are written, returns False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not (self._busy or self._pending),
+                                       timeout)
+
+    def retry(self):
+        """
+        writes days of failed writes again without waiting for a new save
+        """
+        with self._cond:
+            if self._failed:
+                self._failed.update(self._pending)
+                self._pending, self._failed = self._failed, {}
+                self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._failed.update(self._pending)
+            self._pending = self._failed
+            self._failed = {}
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    # private
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                batch = self._failed
+                batch.update(self._pending)
+                self._failed, self._pending = {}, {}
+                self._busy = True
+            error = None
+            try:
+                self._storage.save_days(batch)
+            except Exception as e:
+                error = e
+            with self._cond:
+                if error:
+                    # pending saves of the same days are newer and win
+                    self._failed = batch
+                self._busy = False
+                self._cond.notify_all()
+            self._results.put((len(batch), error))
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+import queue
+import sys
+import threading
+
+
+class YearEntry:
+    """
+    Parsed year: activity store, tile colors by date and summary totals,
+    colors_version tells which config version the colors are from
+    """
+
+    def __init__(self, year, store, colors, summary=None, colors_version=None):
+        self.year = year
+        self.store = store
+        self.colors = colors
+        self.summary = summary
+        self.colors_version = colors_version
+
+    def nbytes(self):
+        # colors share their hex strings, count dict slots and date keys
+        return self.store.nbytes() + sys.getsizeof(self.colors) + 32 * len(self.colors)
+
+
+class YearCache:
+    """
+    LRU cache of loaded years bounded by max_bytes.
+    Years requested with prefetch() are loaded by a worker thread.
+    load(year) must return a YearEntry and must not touch the ui.
+    """
+
+    def __init__(self, load, max_bytes):
+        self._load = load
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._current = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._prefetch_loop,
+                                        name='year-prefetch', daemon=True)
+        self._worker.start()
+
+    def get(self, year):
+        """
+        returns entry of year, loads it if not cached and makes it current,
+        the current year is never evicted
+        """
+        entry, loaded = None, None
+        while True:
+            with self._lock:
+                self._current = year
+                entry = self._entries.get(year)
+                if entry:
+                    self._entries.move_to_end(year)
+                    break
+                loading = self._loading.get(year)
+                if loading is None:
+                    loaded = self._loading[year] = threading.Event()
+                    break
+            # prefetch of this year is running, wait for it
+            loading.wait()
+        if entry is None:
+            try:
+                entry = self._load(year)
+                with self._lock:
+                    self._entries[year] = entry
+            finally:
+                with self._lock:
+                    del self._loading[year]
+                loaded.set()
+        self._evict()
+        return entry
+
+    def prefetch(self, *years):
+        for year in years:
+            self._queue.put(year)
+
+    def join(self):
+        """
+        waits until prefetched years are loaded
+        """
+        self._queue.join()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, year):
+        with self._lock:
+            return year in self._entries
+
+    def nbytes(self):
+        with self._lock:
+            return sum(entry.nbytes() for entry in self._entries.values())
+
+    # private
+    def _prefetch_loop(self):
+        while True:
+            year = self._queue.get()
+            try:
+                self._prefetch(year)
+            finally:
+                self._queue.task_done()
+
+    def _prefetch(self, year):
+        with self._lock:
+            if year in self._entries or year in self._loading:
+                return
+            loaded = self._loading[year] = threading.Event()
+        try:
+            entry = self._load(year)
+            with self._lock:
+                # prefetched years are the first to go
+                self._entries[year] = entry
+                self._entries.move_to_end(year, last=False)
+        except Exception:
+            # year is loaded again in get(), which reports the error
+            pass
+        finally:
+            with self._lock:
+                del self._loading[year]
+            loaded.set()
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            total = sum(entry.nbytes() for entry in self._entries.values())
+            for year in list(self._entries):
+                if total <= self._max_bytes:
+                    break
+                if year != self._current:
+                    total -= self._entries.pop(year).nbytes()
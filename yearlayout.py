@@ -0,0 +1,116 @@
+import calendar
+from datetime import date, datetime
+
+MONTH_RANGE = range(1, 13)
+DAYS_MAX = 366
+
+
+class YearLayout:
+    """
+    Tile positions of a year grid, one week per column.
+    tiles[i] is (col, row) of the i-th day of year,
+    separators[m] are (col, row) polyline points around month m + 1.
+    """
+
+    def __init__(self, tiles, separators):
+        self.tiles = tiles
+        self.separators = separators
+
+    def days(self):
+        return len(self.tiles)
+
+
+_layouts = {}
+
+
+def year_layout(year):
+    """
+    returns memoized layout of year, layouts depend only on
+    weekday of January 1st and leap year so there are 14 of them
+    """
+    key = (calendar.weekday(year, 1, 1), calendar.isleap(year))
+    layout = _layouts.get(key)
+    if layout is None:
+        first = date(year, 1, 1).toordinal()
+        tiles = [None] * (366 if key[1] else 365)
+        for month in MONTH_RANGE:
+            for col, row, day in pos_tile_date(year, month):
+                tiles[day.toordinal() - first] = (col, row)
+        separators = tuple(tuple(pos_separ(year, month)) for month in MONTH_RANGE)
+        layout = _layouts.setdefault(key, YearLayout(tuple(tiles), separators))
+    return layout
+
+
+def week_column(year, day):
+    """
+    returns grid column of the week containing day, without isocalendar
+    """
+    first = date(year, 1, 1)
+    first_monday = first.toordinal() - first.weekday()
+    # January 1st from Friday on belongs to last week of previous year
+    offset = 1 if first.weekday() <= 3 else 0
+    return (day.toordinal() - first_monday) // 7 + offset
+
+
+def day_at(year, col, row):
+    """
+    returns date shown at grid column and row of year, None outside the year
+    """
+    first = date(year, 1, 1)
+    first_monday = first.toordinal() - first.weekday()
+    offset = 1 if first.weekday() <= 3 else 0
+    ordinal = first_monday + (col - offset) * 7 + row
+    if 0 <= row < 7 and first.toordinal() <= ordinal <= date(year, 12, 31).toordinal():
+        return date.fromordinal(ordinal)
+    return None
+
+
+def weeknr_weekday_date(year, month):
+    c = calendar.Calendar()
+    return [(d.isocalendar()[1], d.weekday(), d)
+            for d in c.itermonthdates(year, month)]
+
+
+def pos_tile_date(year, month):
+    """
+    calculates widget grid positions by returning (row,col,date)
+    triple for given month, one week per column
+    """
+    for (week_nr, week_day, day) in weeknr_weekday_date(year, month):
+        if (month == day.month):
+            if (month == 1 and (week_nr == 52 or week_nr == 53)):
+                yield (0, week_day, day)
+            elif (month == 12 and week_nr == 1):
+                yield (53, week_day, day)
+            else:
+                yield (week_nr, week_day, day)
+
+
+def pos_separ(year, month):
+    last_day = calendar.monthrange(year, month)[1]
+    first_date = datetime(year=year, month=month, day=1)
+    last_date = datetime(year=year, month=month, day=last_day)
+    first_weekday, last_weekday = first_date.weekday(), last_date.weekday()
+    fnr = first_date.isocalendar()[1]
+    lnr = last_date.isocalendar()[1]
+    first_weeknr = 0 if (fnr == 52 or fnr == 53) else fnr
+    last_weeknr = 53 if lnr == 1 else lnr
+    points = []
+    if first_weekday == 0:
+        first_pos = (first_weeknr, 0)
+        points.extend(first_pos)
+    else:
+        first_pos = (first_weeknr + 1, 0)
+        points.extend(first_pos)
+        points.extend((first_weeknr + 1, first_weekday))
+        points.extend((first_weeknr, first_weekday))
+    points.extend((first_weeknr, 7))
+    if last_weekday == 6:
+        points.extend((last_weeknr + 1, 7))
+    else:
+        points.extend((last_weeknr, 7))
+        points.extend((last_weeknr, last_weekday + 1))
+        points.extend((last_weeknr + 1, last_weekday + 1))
+    points.extend((last_weeknr + 1, 0))
+    points.extend(first_pos)
+    return points